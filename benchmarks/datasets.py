@@ -0,0 +1,72 @@
+"""
+Synthetic CSV datasets for benchmarks, from 10k to 10M rows.
+
+    python -m benchmarks.datasets --rows 1M --out /tmp/sales_1M.csv
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "10M": 10_000_000}
+CHUNK_ROWS = 500_000
+CATEGORIES = [f"category_{i}" for i in range(40)]
+REGIONS = ["North", "South", "East", "West", "Central"]
+
+
+def parse_size(text):
+    """'100k', '1M' or a plain row count"""
+    if text in SIZES:
+        return SIZES[text]
+    return int(float(text.lower().replace("k", "e3").replace("m", "e6")))
+
+
+def _chunk(start, rows, customers, rng):
+    """A sales-like mix of ids, dates, low-cardinality text, numbers, flags and free text"""
+    ids = np.arange(start, start + rows)
+    return pd.DataFrame({
+        "order_id": ids,
+        "customer_id": rng.integers(1, customers + 1, rows),
+        "order_date": pd.Timestamp("2020-01-01") + pd.to_timedelta(ids % (4 * 365 * 24 * 60), unit="min"),
+        "category": rng.choice(CATEGORIES, rows),
+        "region": rng.choice(REGIONS, rows),
+        "quantity": rng.integers(1, 20, rows),
+        "unit_price": np.round(rng.gamma(2.0, 20.0, rows), 2),
+        "discount": np.where(rng.random(rows) < 0.1, np.nan, np.round(rng.random(rows) * 0.3, 2)),
+        "returned": rng.random(rows) < 0.05,
+        "note": np.where(rng.random(rows) < 0.2, "gift wrap requested", ""),
+    })
+
+
+def generate_csv(path, rows, seed=0):
+    """Write a synthetic CSV of `rows` rows in chunks (bounded memory); returns the path"""
+    rng = np.random.default_rng(seed)
+    customers = max(rows // 10, 1)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="") as f:
+        for start in range(0, rows, CHUNK_ROWS):
+            _chunk(start, min(CHUNK_ROWS, rows - start), customers, rng).to_csv(f, index=False, header=start == 0)
+    return path
+
+
+def cached_csv(directory, size, seed=0):
+    """Generate the dataset for a size once and reuse it across runs"""
+    path = os.path.join(directory, f"sales_{size}_{seed}.csv")
+    if not os.path.exists(path):
+        generate_csv(path + ".tmp", parse_size(size), seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100k", help=f"One of {', '.join(SIZES)} or a row count")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_csv(args.out, parse_size(args.rows), args.seed)
+    print(f"Wrote {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Cold-start budget for the login page.
+
+Runs app.py once in a fresh interpreter (Streamlit bare mode, in-memory MongoDB, no
+network), the way a new container renders its first login page, and checks that:
+
+  - the run, imports included, stays within --max-seconds
+  - peak RSS stays within --max-rss-mb
+  - none of the analytics stack (pandas, numpy, pyarrow, pandasai, matplotlib, duckdb) was imported
+
+It then imports dashboard.py in the same process to report what the first run after
+login costs on top.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --max-seconds 1.5 --repeat 5
+
+Exits with status 1 when a budget is exceeded.
+"""
+import os
+import sys
+import json
+import time
+import runpy
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from benchmarks.sandbox import REPO_ROOT, configure, peak_rss_mb
+
+DEFAULT_MAX_SECONDS = 2.0
+DEFAULT_MAX_RSS_MB = 200
+# Modules only the logged-in app needs; loading any of them on the login page is a failure.
+# (plotly is left out: Streamlit itself imports plotly.graph_objects, whose submodules load lazily.)
+DEFERRED_MODULES = ["pandas", "numpy", "pyarrow", "pandasai", "matplotlib", "duckdb"]
+# Same server options as the start command in render.yaml
+STREAMLIT_OPTIONS = {
+    "server.fileWatcherType": "none",
+    "secrets.files": [os.path.join(".streamlit", "secrets.toml")],
+}
+
+
+def measure():
+    """Timings and memory for one cold login page render (runs inside the worker process)"""
+    start = time.perf_counter()
+    import streamlit as st
+    from streamlit import config
+    for option, value in STREAMLIT_OPTIONS.items():
+        config.set_option(option, value)
+    streamlit_seconds = time.perf_counter() - start
+
+    runpy.run_path(os.path.join(REPO_ROOT, "app.py"), run_name="__main__")
+    metrics = {
+        "login_seconds": time.perf_counter() - start,
+        "streamlit_import_seconds": streamlit_seconds,
+        "login_rss_mb": peak_rss_mb(),
+        "login_modules": len(sys.modules),
+        "deferred_loaded": [name for name in DEFERRED_MODULES if name in sys.modules],
+    }
+
+    start = time.perf_counter()
+    try:
+        import dashboard  # noqa: F401
+    except ImportError as e:
+        print(f"Skipping dashboard import ({e})", file=sys.stderr)
+    else:
+        metrics["dashboard_import_seconds"] = time.perf_counter() - start
+        metrics["dashboard_rss_mb"] = peak_rss_mb()
+        metrics["dashboard_modules"] = len(sys.modules)
+    st.cache_resource.clear()
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()}
+
+
+def _run_worker():
+    command = [sys.executable, "-m", "benchmarks.import_budget", "--worker"]
+    # Bare-mode Streamlit warns on every widget call; only show its output if the run fails
+    result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        result.check_returncode()
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    parser.add_argument("--max-rss-mb", type=float, default=DEFAULT_MAX_RSS_MB)
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes to take the median over")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with tempfile.TemporaryDirectory() as workdir:
+            configure(workdir, {"MONGO_URI": "mongomock://", "DATASET_STORE": "local",
+                                "DATASET_DIR": os.path.join(workdir, "data")})
+            print(json.dumps(measure()))
+        return
+
+    runs = [_run_worker() for _ in range(args.repeat)]
+    median = lambda key: statistics.median(run[key] for run in runs)
+    login_seconds, login_rss = median("login_seconds"), median("login_rss_mb")
+    print(f"Login page:  {login_seconds:.2f}s (streamlit import {median('streamlit_import_seconds'):.2f}s), "
+          f"{login_rss:.0f} MB peak RSS, {runs[0]['login_modules']} modules")
+    if "dashboard_import_seconds" in runs[0]:
+        print(f"First run after login: +{median('dashboard_import_seconds'):.2f}s, "
+              f"{median('dashboard_rss_mb'):.0f} MB peak RSS, {runs[0]['dashboard_modules']} modules")
+
+    failures = []
+    if login_seconds > args.max_seconds:
+        failures.append(f"login page took {login_seconds:.2f}s (budget {args.max_seconds:.2f}s)")
+    if login_rss > args.max_rss_mb:
+        failures.append(f"login page peaked at {login_rss:.0f} MB RSS (budget {args.max_rss_mb:.0f} MB)")
+    deferred = sorted({name for run in runs for name in run["deferred_loaded"]})
+    if deferred:
+        failures.append(f"login page imported {', '.join(deferred)}")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
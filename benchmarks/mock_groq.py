@@ -0,0 +1,157 @@
+"""
+Local OpenAI-compatible chat completions server standing in for Groq in benchmarks.
+
+    python -m benchmarks.mock_groq --port 8099 --latency-ms 300 --rate-limit-every 10
+
+Then point the app or the harness at it with GROQ_BASE_URL=http://127.0.0.1:8099/openai/v1.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# pandasai extracts and runs the python block; this one works on any dataframe
+DEFAULT_REPLY = """```python
+result = {"type": "number", "value": len(dfs[0])}
+```"""
+
+
+class MockSettings:
+    def __init__(self, latency_ms=200, jitter_ms=50, rate_limit_every=0, rate_limit_ratio=0.0,
+                 retry_after=1.0, reply=DEFAULT_REPLY, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.reply = reply
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    def next_request(self):
+        """Count a request and decide whether it gets a 429"""
+        with self.lock:
+            self.requests += 1
+            limited = (self.rate_limit_every and self.requests % self.rate_limit_every == 0) \
+                or self.random.random() < self.rate_limit_ratio
+            if limited:
+                self.rate_limited += 1
+            delay = max(self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+        return limited, delay
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # Keep-alive, like the real API
+    settings = MockSettings()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _rate_limit_headers(self):
+        return {
+            "x-ratelimit-limit-requests": "100000",
+            "x-ratelimit-remaining-requests": "99999",
+            "x-ratelimit-reset-requests": "0.1s",
+            "x-ratelimit-limit-tokens": "10000000",
+            "x-ratelimit-remaining-tokens": "9999999",
+            "x-ratelimit-reset-tokens": "0.1s",
+        }
+
+    def _usage(self, request, content):
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(content) // 4 + 1
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        limited, delay = self.settings.next_request()
+        time.sleep(delay)
+        if limited:
+            retry_after = self.settings.retry_after
+            self._send_json(429, {"error": {
+                "message": f"Rate limit reached. Please try again in {retry_after}s.",
+                "type": "tokens", "code": "rate_limit_exceeded",
+            }}, headers={"retry-after": str(retry_after)})
+            return
+
+        content = self.settings.reply
+        usage = self._usage(request, content)
+        if request.get("stream"):
+            self._stream(request, content, usage)
+            return
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }, headers=self._rate_limit_headers())
+
+    def _stream(self, request, content, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in self._rate_limit_headers().items():
+            self.send_header(name, value)
+        self.end_headers()
+        words = content.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else word + " "
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": request.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "choices": [
+            {"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        self.close_connection = True
+
+
+def start_mock_server(settings=None, host="127.0.0.1", port=0):
+    """Serve in a background thread; returns (server, base_url). Port 0 picks a free port."""
+    handler = type("Handler", (MockGroqHandler,), {"settings": settings or MockSettings()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/openai/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Random share of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.rate_limit_every, args.rate_limit_ratio, args.retry_after)
+    server, base_url = start_mock_server(settings, args.host, args.port)
+    print(f"Mock Groq API listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
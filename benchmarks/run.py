@@ -0,0 +1,254 @@
+"""
+Load and latency benchmarks for the upload → store → chat → chart pipeline.
+
+Runs against a local mock of the Groq API (benchmarks.mock_groq) and an in-memory
+MongoDB (mongomock) unless --mongo-uri points at a real mongod. Every dataset size runs
+in its own process so peak RSS is measured per size.
+
+    python -m benchmarks.run --sizes 10k,100k                 # compare with the baseline
+    python -m benchmarks.run --sizes 10k,100k --save-baseline # record a new baseline
+
+Each size is measured in --repeat fresh processes and every metric is the median of
+those runs, so one slow sample does not fail the comparison.
+
+Exits with status 1 when a metric regresses past the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from benchmarks.datasets import cached_csv, parse_size
+from benchmarks.mock_groq import MockSettings, start_mock_server
+from benchmarks.sandbox import REPO_ROOT, configure, peak_rss_mb
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+# Differences below these floors are noise, whatever the ratio
+NOISE_FLOORS = {"seconds": 0.005, "mb": 5.0, "bytes": 1024}
+CHARTS = [
+    ("Line", "order_date", "unit_price"),
+    ("Bar", "category", "quantity"),
+    ("Histogram", "unit_price", None),
+    ("Boxplot", "region", "unit_price"),
+    ("Scatter", "quantity", "unit_price"),
+]
+QUESTIONS = ["How many orders are there?", "Which region has the most returns?", "Plot sales by category"]
+SESSION_REPEATS = 5
+
+
+def _configure(workdir, base_url, mongo_uri):
+    configure(workdir, {
+        "MONGO_URI": mongo_uri,
+        "DATASET_STORE": "local",
+        "DATASET_DIR": os.path.join(workdir, "data"),
+        "GROQ_API_KEY": "benchmark",
+        "GROQ_BASE_URL": base_url,
+        "GROQ_REQUESTS_PER_MINUTE": 100000,
+        "GROQ_TOKENS_PER_MINUTE": 100000000,
+    })
+
+
+def _timed(fn, repeat=1):
+    """(last result, median seconds over `repeat` runs)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def _bench_agent(df, dataset_key, profile):
+    """Seconds per agent.chat spent outside the LLM call, and the LLM seconds themselves"""
+    from pandasai import Agent
+    from llms.groq_llm import GroqLLM
+    from llms.prompt_budget import PromptBudget
+
+    prompt_budget = PromptBudget().register([(dataset_key, df)], {dataset_key: profile})
+    llm = GroqLLM(prompt_budget=prompt_budget)
+    agent = Agent([df], config={"llm": llm, "conversational": True, "verbose": False, "enable_cache": False})
+
+    llm_seconds = []
+    call = llm.call
+
+    def timed_call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            llm_seconds.append(time.perf_counter() - start)
+
+    llm.call = timed_call
+    totals = []
+    for question in QUESTIONS:
+        _, seconds = _timed(lambda: agent.chat(question))
+        totals.append(seconds)
+    return {
+        "agent_chat_seconds": statistics.median(totals),
+        "agent_overhead_seconds": max(statistics.median(totals) - sum(llm_seconds) / len(totals), 0.0),
+        "agent_llm_seconds": sum(llm_seconds) / len(totals),
+    }
+
+
+def bench_size(size, data_dir, skip_agent=False):
+    """All metrics for one dataset size (runs inside the worker process)"""
+    from utils import db
+    from utils.ingest import read_csv_chunked
+    from utils.helpers import get_file_id, clean_column_names
+    from utils.chart_data import reduced_chart
+
+    path = cached_csv(data_dir, size)
+    metrics = {"rows": parse_size(size), "csv_mb": round(os.path.getsize(path) / 1e6, 1)}
+
+    with open(path, "rb") as f:
+        file_id, metrics["hash_seconds"] = _timed(lambda: get_file_id(f))
+        (df, report), metrics["parse_seconds"] = _timed(lambda: read_csv_chunked(f))
+        _, metrics["parse_pyarrow_seconds"] = _timed(lambda: read_csv_chunked(f, engine="pyarrow"))
+    df = clean_column_names(df)
+    metrics["frame_mb"] = round(report["optimized_bytes"] / 1e6, 1)
+
+    # First upload: Parquet write plus column profile
+    session, metrics["store_seconds"] = _timed(lambda: db.new_file_session("bench", os.path.basename(path), file_id, lambda: df))
+    session["chat_history"] = [
+        (f"question {i}", {"type": "text", "content": f"answer {i} " * 20}) for i in range(20)
+    ]
+    sessions = {file_id: session}
+    _, metrics["save_session_seconds"] = _timed(lambda: db.save_user_session("bench", sessions), SESSION_REPEATS)
+    _, metrics["load_session_seconds"] = _timed(lambda: db.load_user_session("bench"), SESSION_REPEATS)
+
+    def cold_load():
+        db.get_dataset_store().cache.discard(session["dataset_ref"]["key"])
+        return db.get_dataset_store().load(session["dataset_ref"])
+    _, metrics["dataset_load_seconds"] = _timed(cold_load)
+
+    for graph_type, x, y in CHARTS:
+        (fig, _), seconds = _timed(lambda: reduced_chart(df, graph_type, x, y))
+        metrics[f"chart_{graph_type.lower()}_seconds"] = seconds
+        metrics[f"chart_{graph_type.lower()}_bytes"] = len(fig.to_json())
+
+    if not skip_agent:
+        try:
+            profile = db.get_dataset_profile(session["dataset_ref"], lambda: df)
+            metrics.update(_bench_agent(df, session["dataset_ref"]["key"], profile))
+        except ImportError as e:
+            print(f"Skipping agent benchmark ({e})", file=sys.stderr)
+
+    metrics["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return {key: round(value, 4) if isinstance(value, float) else value for key, value in metrics.items()}
+
+
+def _run_worker(size, args, base_url):
+    command = [sys.executable, "-m", "benchmarks.run", "--worker", size, "--base-url", base_url,
+               "--data-dir", args.data_dir, "--mongo-uri", args.mongo_uri]
+    if args.skip_agent:
+        command.append("--skip-agent")
+    output = subprocess.run(command, cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _median_metrics(runs):
+    """Per-metric median over repeated worker runs"""
+    metrics = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if key in run]
+        median = statistics.median(values)
+        metrics[key] = round(median, 4) if isinstance(median, float) else median
+    return metrics
+
+
+def _unit(metric):
+    if metric.endswith("_seconds"):
+        return "seconds"
+    if metric.endswith("_mb"):
+        return "mb"
+    if metric.endswith("_bytes"):
+        return "bytes"
+    return None
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (size, metric, baseline, current, change, regressed) for every measured metric"""
+    rows = []
+    for size, metrics in results.items():
+        for metric, current in metrics.items():
+            unit = _unit(metric)
+            previous = baseline.get(size, {}).get(metric)
+            if unit is None or previous is None or metric == "csv_mb":
+                continue
+            change = (current - previous) / previous if previous else 0.0
+            regressed = change > tolerance and current - previous > NOISE_FLOORS[unit]
+            rows.append((size, metric, previous, current, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,100k", help="Comma-separated, e.g. 10k,100k,1M,10M")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "allytics-bench"))
+    parser.add_argument("--mongo-uri", default="mongomock://", help="mongomock:// or a local mongod URI")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Mock LLM latency per request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Mock answers every Nth request with a 429")
+    parser.add_argument("--skip-agent", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh processes per size to take the median over")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--output", help="Also write the results as JSON here")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with tempfile.TemporaryDirectory() as workdir:
+            _configure(workdir, args.base_url, args.mongo_uri)
+            print(json.dumps(bench_size(args.worker, args.data_dir, args.skip_agent)))
+        return
+
+    server, base_url = start_mock_server(MockSettings(latency_ms=args.latency_ms, rate_limit_every=args.rate_limit_every))
+    try:
+        results = {}
+        for size in args.sizes.split(","):
+            print(f"Benchmarking {size} rows...", file=sys.stderr)
+            results[size] = _median_metrics([_run_worker(size, args, base_url) for _ in range(max(args.repeat, 1))])
+    finally:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Saved baseline for {', '.join(results)} to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(json.dumps(results, indent=2))
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    rows = compare(results, baseline, args.tolerance)
+    print(f"{'size':>6}  {'metric':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for size, metric, previous, current, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{size:>6}  {metric:<28} {previous:>12.4g} {current:>12.4g} {change:>+8.0%}{flag}")
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Throwaway configuration for benchmark worker processes. Kept free of pandas and numpy
+so the cold-start check can import it without skewing what it measures.
+"""
+import os
+import sys
+import json
+import platform
+import resource
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def configure(workdir, secrets):
+    """Point the app's st.secrets at local stand-ins before any app module is imported"""
+    os.makedirs(os.path.join(workdir, ".streamlit"), exist_ok=True)
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        for key, value in secrets.items():
+            f.write(f"{key} = {json.dumps(value)}\n")
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_ROOT)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
@@ -0,0 +1,699 @@
+import os
+import io
+import json
+import base64
+import streamlit as st
+import pandas as pd
+from pandasai import Agent
+from llms.groq_llm import GroqLLM
+from llms.prompt_budget import PromptBudget
+from utils.helpers import get_file_id, clean_column_names
+from utils.ingest import read_csv_chunked, agent_frame
+from utils.db import (
+    new_file_session, open_file_session, chat_count, get_session_df, file_session_update, chat_entry_update,
+    clear_chat_update, delete_file_update, release_dataset, dataset_holder, get_answer_cache, get_artifact_store, get_dataset_profile, get_sql_engine
+)
+from utils.agent_pool import AgentPool, new_memory, add_exchange, MEMORY_SIZE
+from utils.chart_data import reduced_chart, reduced_chart_sql
+from utils.preview import PAGE_SIZES, FILTER_OPS, row_order, page_slice, row_count, sql_page, sql_row_count
+from utils.profile import columns_of_kind, answer_from_profile
+from utils.relations import find_relationships, describe_relationships
+from utils.jobs import JobRunner, JobLimitError, DONE, CANCELLED
+from utils.telemetry import telemetry, span
+import plotly.graph_objects as go
+from matplotlib.figure import Figure
+import matplotlib.pyplot as plt
+
+# The analytics half of the app. app.py imports it on the first run after login, so the
+# login and register pages never load pandas, pandasai, plotly or matplotlib.
+
+if int(pd.__version__.split(".")[0]) < 3:
+    # Pooled agents run generated code on shallow copies of shared cached frames; with
+    # copy-on-write a write in that code copies the touched columns instead of changing
+    # the cached frame (the default from pandas 3)
+    pd.set_option("mode.copy_on_write", True)
+
+RECENT_TURNS = 5          # Chat turns always rendered in full
+JOB_POLL_SECONDS = 0.5
+HISTORY_PAGE_SIZE = 10    # Older turns rendered per page when expanded
+
+def store_chart(answer):
+    """Store a chart in the artifact store and return the reference kept in chat history"""
+    try:
+        with span("chart.store", kind=type(answer).__name__) as store_span:
+            if isinstance(answer, go.Figure):
+                # Keep the plotly spec as JSON; no Kaleido rasterization needed
+                ref = get_artifact_store().save_plotly(answer)
+            else:
+                buf = io.BytesIO()
+                answer.savefig(buf, format='png', dpi=150, bbox_inches='tight')
+                ref = get_artifact_store().save_image(buf.getvalue())
+            store_span.set(bytes=ref.get("nbytes"))
+            return ref
+    except Exception as e:
+        st.warning(f"Could not store chart: {e}")
+        return {"type": "text", "content": "Chart conversion failed"}
+    return None
+
+def process_and_store_answer(answer):
+    """Process answer and return appropriate storage format"""
+    # Handle chart objects
+    if isinstance(answer, (go.Figure, Figure)):
+        return store_chart(answer)
+    
+    # Handle existing image files
+    elif isinstance(answer, str) and os.path.exists(answer) and answer.lower().endswith((".png", ".jpg", ".jpeg")):
+        try:
+            with open(answer, "rb") as f:
+                return get_artifact_store().save_image(f.read())
+        except:
+            return {"type": "text", "content": "Image load failed"}
+    
+    # Handle text responses
+    else:
+        return {"type": "text", "content": str(answer)}
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_artifact(key):
+    # Artifacts are content-addressed, so a cached copy can never go stale
+    return get_artifact_store().load(key)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def decode_base64_image(data):
+    return base64.b64decode(data)
+
+def display_image_ref(stored_answer, index):
+    """Show the thumbnail first and only fetch the full image when asked for"""
+    thumb = load_artifact(stored_answer["thumb"]) if stored_answer.get("thumb") else None
+    full_size = thumb is None or st.toggle("Full size", key=f"full_size_{index}")
+    data = load_artifact(stored_answer["key"]) if full_size else thumb
+    if data is None:
+        st.info("This chart has expired from storage.")
+    else:
+        st.image(data, caption=f"Chart #{index+1}", use_container_width=full_size)
+
+def display_stored_answer(stored_answer, index):
+    """Display answer based on its stored format"""
+    if isinstance(stored_answer, dict):
+        if stored_answer["type"] == "base64_image":
+            try:
+                # Display base64 image
+                st.image(
+                    decode_base64_image(stored_answer['data']), 
+                    caption=f"Chart #{index+1}", 
+                    use_container_width=True
+                )
+            except Exception as e:
+                st.error(f"Failed to display chart: {e}")
+        elif stored_answer["type"] == "image_ref":
+            display_image_ref(stored_answer, index)
+        elif stored_answer["type"] == "plotly_ref":
+            data = load_artifact(stored_answer["key"])
+            if data is None:
+                st.info("This chart has expired from storage.")
+            else:
+                st.plotly_chart(go.Figure(json.loads(data)), use_container_width=True)
+        elif stored_answer["type"] == "text":
+            st.markdown(stored_answer["content"])
+        elif stored_answer["type"] == "plotly_json":
+            try:
+                fig = go.Figure(json.loads(stored_answer["data"]))
+                st.plotly_chart(fig, use_container_width=True)
+            except:
+                st.error("Failed to display chart")
+    else:
+        # Legacy format handling - convert to new format
+        if isinstance(stored_answer, str) and os.path.exists(stored_answer) and stored_answer.lower().endswith((".png", ".jpg", ".jpeg")):
+            try:
+                st.image(stored_answer, caption=f"Chart #{index+1}", use_container_width=True)
+            except:
+                st.error("Failed to load legacy image")
+        elif isinstance(stored_answer, go.Figure):
+            # Render legacy figures directly rather than rasterizing them on every rerun
+            st.plotly_chart(stored_answer, use_container_width=True)
+        elif isinstance(stored_answer, Figure):
+            st.pyplot(stored_answer)
+        else:
+            st.markdown(str(stored_answer))
+
+def upload_content_hash(uploaded_file):
+    """get_file_id for the uploader's file, hashed once per upload instead of on every rerun"""
+    cached = st.session_state.get("upload_hash")
+    if cached is None or cached[0] != uploaded_file.file_id:
+        cached = (uploaded_file.file_id, get_file_id(uploaded_file))
+        st.session_state.upload_hash = cached
+    return cached[1]
+
+def parse_upload(uploaded_file):
+    """Read an uploaded CSV in chunks with a progress bar and report the memory saved"""
+    progress = st.progress(0.0, text=f"Reading {uploaded_file.name}...")
+    with span("ingest.read_csv", bytes=uploaded_file.size) as read_span:
+        df, report = read_csv_chunked(
+            uploaded_file,
+            engine=st.secrets.get("CSV_ENGINE"),
+            progress=lambda fraction: progress.progress(fraction, text=f"Reading {uploaded_file.name}... {fraction:.0%}")
+        )
+        read_span.set(rows=report["rows"], frame_bytes=report["optimized_bytes"])
+    progress.empty()
+    st.session_state.last_ingest = report
+    return clean_column_names(df)
+
+@st.cache_data(max_entries=64, show_spinner="Preparing chart...")
+def build_graph(dataset_key, graph_type, x_axis, y_axis, _load_df, _kinds):
+    sql_engine = get_sql_engine()
+    # Keyed by dataset content hash; the frame itself is not hashed
+    with span("chart.build", graph_type=graph_type, engine="sql" if sql_engine is not None else "pandas"):
+        if sql_engine is not None:
+            return reduced_chart_sql(sql_engine, dataset_key, graph_type, x_axis, y_axis, _kinds)
+        return reduced_chart(_load_df(), graph_type, x_axis, y_axis)
+
+@st.cache_resource(max_entries=16, show_spinner="Sorting and filtering...")
+def preview_order(dataset_key, sort_by, ascending, filter_column, filter_op, filter_value, _load_df):
+    sql_engine = get_sql_engine()
+    # Row positions can be as long as the dataset; cache_resource keeps them unpickled
+    if sql_engine is not None:
+        return sql_row_count(sql_engine, dataset_key, filter_column, filter_op, filter_value), None
+    df = _load_df()
+    positions = row_order(df, sort_by, ascending, filter_column, filter_op, filter_value)
+    return row_count(df, positions), positions
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def preview_page(dataset_key, order_key, page, page_size, columns, _load_df, _positions):
+    sql_engine = get_sql_engine()
+    if sql_engine is not None:
+        return sql_page(sql_engine, dataset_key, list(columns), *order_key, page=page, page_size=page_size)
+    return page_slice(_load_df(), _positions, page, page_size, list(columns))
+
+def show_data_preview(dataset_key, load_df, profile):
+    """One page of the dataset at a time, sorted and filtered on the server"""
+    all_columns = list(profile["columns"])
+    columns = st.multiselect("Columns", all_columns, default=all_columns[:20], key="preview_columns")
+    c1, c2, c3 = st.columns(3)
+    sort_by = c1.selectbox("Sort by", ["(none)"] + all_columns, key="preview_sort")
+    ascending = c2.radio("Order", ["Ascending", "Descending"], horizontal=True, key="preview_order") == "Ascending"
+    page_size = c3.selectbox("Rows per page", PAGE_SIZES, index=1, key="preview_page_size")
+    f1, f2, f3 = st.columns(3)
+    filter_column = f1.selectbox("Filter column", ["(none)"] + all_columns, key="preview_filter_column")
+    filter_op = f2.selectbox("Condition", FILTER_OPS, key="preview_filter_op")
+    filter_value = f3.text_input("Value", key="preview_filter_value").strip()
+
+    sort_by = None if sort_by == "(none)" else sort_by
+    filter_column = None if filter_column == "(none)" or not filter_value else filter_column
+    order_key = (sort_by, ascending, filter_column, filter_op, filter_value)
+    try:
+        total, positions = preview_order(dataset_key, *order_key, load_df)
+    except Exception as e:
+        st.error(f"Can't apply filter: {e}")
+        return
+    pages = max(1, -(-total // page_size))
+    if st.session_state.get("preview_page", 1) > pages:
+        # A narrower filter or bigger page size can leave the old page out of range
+        st.session_state.preview_page = pages
+    page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1, key="preview_page")
+    page_df = preview_page(dataset_key, order_key, page, page_size, tuple(columns or all_columns), load_df, positions)
+    st.dataframe(page_df, use_container_width=True)
+    start = (page - 1) * page_size
+    shown = f"Rows {start + 1:,}–{min(start + page_size, total):,} of {total:,}" if total else "No matching rows"
+    if total != profile["rows"]:
+        shown += f" (filtered from {profile['rows']:,})"
+    st.caption(shown)
+
+def profile_table(profile):
+    """Flat per-column view of the stats index for display"""
+    def fmt(value):
+        # Mixed numbers and dates in one column; render everything as text
+        if value is None:
+            return ""
+        return f"{value:,.4g}" if isinstance(value, float) else str(value)
+
+    rows = []
+    for col, stats in profile["columns"].items():
+        rows.append({
+            "column": col,
+            "type": stats["dtype"],
+            "missing": stats["nulls"],
+            "distinct": stats["unique"],
+            "min": fmt(stats.get("min")),
+            "max": fmt(stats.get("max")),
+            "mean": fmt(stats.get("mean")),
+            "top value": fmt(stats["top"][0][0]) if stats.get("top") else "",
+        })
+    return pd.DataFrame(rows).set_index("column")
+
+def render_chat_entry(index, question, stored_answer):
+    with st.chat_message("user"):
+        st.markdown(question)
+    with st.chat_message("assistant"):
+        st.write(f"↪️ Response #{index+1}")
+        display_stored_answer(stored_answer, index)
+
+def render_chat_history(chat_history):
+    """Render the latest turns in full and older turns one page at a time, only when expanded"""
+    older_count = max(len(chat_history) - RECENT_TURNS, 0)
+    if older_count and st.toggle(f"Show {older_count} earlier messages", key="show_older_chats"):
+        pages = (older_count + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        # Page 1 is the one just before the recent turns
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="chat_history_page")
+        end = older_count - (page - 1) * HISTORY_PAGE_SIZE
+        start = max(end - HISTORY_PAGE_SIZE, 0)
+        for i in range(start, end):
+            render_chat_entry(i, *chat_history[i])
+        st.divider()
+
+    for i in range(older_count, len(chat_history)):
+        render_chat_entry(i, *chat_history[i])
+
+def answer_question(job, pool, pool_key, load_frames, memory, question, cache_key, username):
+    """Job body, run on a worker thread: no Streamlit calls in here"""
+    with span("query", source="agent", user=username, dataset=pool_key, question=question[:200]) as query_span:
+        # Frames are only loaded when the pool has to build a new Agent for them
+        with pool.lease(pool_key, load_frames, memory) as (agent, llm):
+            # Streamed LLM tokens become the job's progress output
+            llm.on_token = job.add_token
+            with span("agent.chat") as chat_span:
+                answer = agent.chat(question)
+            # pandasai runs the generated code inside chat(); whatever the LLM spans
+            # don't account for is prompt assembly, code execution and result parsing
+            chat_span.set(non_llm_seconds=round(chat_span.self_seconds, 6))
+            telemetry.observe("agent.code_execution", chat_span.self_seconds)
+        job.check_cancelled()
+
+        processed_answer = process_and_store_answer(answer)
+
+        # Clear any matplotlib figures to prevent memory leaks
+        if isinstance(answer, Figure):
+            plt.close(answer)
+
+        get_answer_cache().put(cache_key, processed_answer)
+        query_span.set(answer_type=processed_answer.get("type"))
+    return processed_answer
+
+def chat_session(chat_id):
+    """The file session or workspace a chat belongs to, or None once it is gone"""
+    return st.session_state.file_sessions.get(chat_id) or st.session_state.workspaces.get(chat_id)
+
+def record_answer(current, chat_id, question, processed_answer):
+    current["chat_history"].append((question, processed_answer))
+    if chat_id in st.session_state.file_sessions:
+        # Workspace chats are kept for the browser session only
+        st.session_state.writer.queue(chat_entry_update(chat_id, question, processed_answer))
+        st.session_state.writer.flush()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_pending_job(job_id):
+    """
+    Poll one running question and show its streamed output. Only this fragment reruns
+    while polling; once the answer is recorded the page reruns once to show it, which
+    also stops the polling.
+    """
+    pending = st.session_state.pending_jobs.get(job_id)
+    if pending is None:
+        return
+    runner = get_job_runner()
+    job = runner.get(job_id)
+    if job is not None and not job.finished:
+        with st.chat_message("assistant"):
+            with st.status("Thinking...", expanded=False):
+                if job.tokens:
+                    st.code(job.partial_output, language="python")
+            if st.button("Cancel", key=f"cancel_job_{job_id}"):
+                runner.cancel(job_id)
+        if not job.finished:
+            return
+
+    # Finished: move the result into the chat history
+    del st.session_state.pending_jobs[job_id]
+    if job is not None:
+        runner.discard(job_id)
+        if job.status == DONE:
+            current = chat_session(pending["chat_id"])
+            if current is not None:
+                record_answer(current, pending["chat_id"], pending["question"], job.result)
+        elif job.status != CANCELLED:
+            st.session_state.job_errors.append({"chat_id": pending["chat_id"], "error": job.error or job.status})
+    st.rerun()
+
+def workspace_relationships(frames):
+    profiles = [get_dataset_profile({"key": key}, lambda df=df: df) for key, df in frames]
+    return find_relationships(frames, profiles)
+
+def build_agent(key, frames):
+    """Agent factory for the pool: one Agent and LLM client per dataset fingerprint (or set of them)"""
+    # Generated code runs on int64/float64/object columns, not the compact stored dtypes
+    frames = [(key, agent_frame(df)) for key, df in frames]
+    # Send a cached schema summary instead of raw head rows, within a token budget
+    prompt_budget = PromptBudget(
+        max_prompt_tokens=int(st.secrets.get("PROMPT_MAX_TOKENS", 3000)),
+        max_completion_tokens=int(st.secrets.get("COMPLETION_MAX_TOKENS", 512)),
+    ).register(frames, {key: get_dataset_profile({"key": key}, lambda df=df: df) for key, df in frames})
+    llm = GroqLLM(prompt_budget=prompt_budget)
+    instructions = """
+        Always provide clear, conversational answers.
+        Avoid raw data dumps. Prefer names, summaries, and charts.
+        """
+    if len(frames) > 1:
+        # Precomputed join keys save the LLM a round of exploring the frames itself
+        instructions += "Several dataframes are loaded; merge them when a question spans more than one.\n"
+        relationships = workspace_relationships(frames)
+        if relationships:
+            instructions += "Likely join keys:\n" + describe_relationships(relationships) + "\n"
+    agent = Agent([df for _, df in frames], config={
+        "llm": llm,
+        "conversational": True,
+        "verbose": False,
+        "enable_cache": False,
+        "custom_instructions": instructions
+    }, memory_size=MEMORY_SIZE)
+    return agent, llm
+
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(
+        max_workers=int(st.secrets.get("JOB_WORKERS", 4)),
+        per_user_limit=int(st.secrets.get("JOBS_PER_USER", 1)),
+        timeout_seconds=int(st.secrets.get("JOB_TIMEOUT_SECONDS", 180)),
+    )
+
+@st.cache_resource
+def get_agent_pool():
+    return AgentPool(
+        build_agent,
+        max_agents=int(st.secrets.get("AGENT_POOL_SIZE", 16)),
+        idle_seconds=int(st.secrets.get("AGENT_IDLE_SECONDS", 1800)),
+    )
+
+def show_chat(chat_id, current, pool_key, load_frames, profile=None):
+    """Chat for a file session or a workspace; pool_key names the agent for its frames"""
+    if current.get("memory") is None:
+        current["memory"] = new_memory(current["chat_history"])
+
+    st.write("### Ask Allytics Anything")
+    st.write(f"🧠 Chat History: {len(current['chat_history'])} entries")
+
+    # Display chat history
+    render_chat_history(current["chat_history"])
+
+    # Questions that failed since the last full run; answers are in the history already
+    errors = st.session_state.job_errors
+    for failed in [failed for failed in errors if failed["chat_id"] == chat_id]:
+        errors.remove(failed)
+        st.error(f"Agent error: {failed['error']}")
+
+    runner = get_job_runner()
+    elsewhere = []
+    for job_id, pending in list(st.session_state.pending_jobs.items()):
+        if pending["chat_id"] == chat_id:
+            with st.chat_message("user"):
+                st.markdown(pending["question"])
+            show_pending_job(job_id)
+        elif chat_session(pending["chat_id"]) is None:
+            # The file was deleted while its question was running
+            runner.cancel(job_id)
+            runner.discard(job_id)
+            del st.session_state.pending_jobs[job_id]
+        else:
+            elsewhere.append(chat_session(pending["chat_id"])["name"])
+    if elsewhere:
+        st.info(f"Still answering your questions about {', '.join(dict.fromkeys(elsewhere))}. Load them to follow along.")
+
+    # Chat input handling; it stays enabled while questions run, and the job runner turns
+    # away questions beyond the per-user limit
+    question = st.chat_input("Type a question...")
+    if question:
+        prev_q = current["chat_history"][-1][0] if current["chat_history"] else None
+        if prev_q == question:
+            st.warning("This question was just asked.")
+            st.stop()
+
+        with span("query.lookup", user=st.session_state.username, dataset=pool_key, question=question[:200]) as query_span:
+            cache_key = get_answer_cache().make_key(pool_key, question, [q for q, _ in current["chat_history"]])
+            # Simple aggregates come straight from the column profile, without an LLM call. The
+            # profile describes the whole dataset, so only for a chat's first question: after
+            # that, "the total amount" may mean the rows an earlier turn narrowed it down to
+            first_question = not current["chat_history"] and not any(
+                pending["chat_id"] == chat_id for pending in st.session_state.pending_jobs.values()
+            )
+            direct_answer = answer_from_profile(question, profile) if profile and first_question else None
+            processed_answer = {"type": "text", "content": direct_answer} if direct_answer else get_answer_cache().get(cache_key)
+            # Misses go on to the agent, whose job records its own "query" trace
+            query_span.set(source="profile" if direct_answer else "cache" if processed_answer else "miss")
+        if processed_answer is not None:
+            add_exchange(current["memory"], question, processed_answer)
+            record_answer(current, chat_id, question, processed_answer)
+            render_chat_entry(len(current["chat_history"]) - 1, question, processed_answer)
+        else:
+            # Run the agent off the script thread; the page polls until it is done
+            try:
+                job = get_job_runner().submit(
+                    st.session_state.username, answer_question,
+                    get_agent_pool(), pool_key, load_frames, current["memory"], question, cache_key,
+                    st.session_state.username
+                )
+            except JobLimitError as e:
+                st.warning(str(e))
+                st.stop()
+            st.session_state.pending_jobs[job.id] = {"chat_id": chat_id, "question": question}
+            # Start polling right here instead of rerunning the whole script
+            with st.chat_message("user"):
+                st.markdown(question)
+            show_pending_job(job.id)
+
+def ensure_dataset(fid, session):
+    """
+    Load what login left out (chat history, a legacy inline CSV) and move a legacy
+    session into the dataset store before it is used
+    """
+    legacy = session.get("dataset_ref") is None
+    open_file_session(st.session_state.username, fid, session)
+    if legacy:
+        st.session_state.writer.queue(file_session_update(fid, session))
+        st.session_state.writer.flush()
+
+def show_workspace(file_ids):
+    """Questions across several files, answered by one agent holding all of their frames"""
+    for fid in file_ids:
+        ensure_dataset(fid, st.session_state.file_sessions[fid])
+    # Same datasets in the same order give the same pooled agent, whoever selects them
+    sessions = sorted((st.session_state.file_sessions[fid] for fid in file_ids), key=lambda s: s["dataset_ref"]["key"])
+    keys = [session["dataset_ref"]["key"] for session in sessions]
+    chat_id = "+".join(sorted(file_ids))
+    current = st.session_state.workspaces.setdefault(chat_id, {
+        "name": " + ".join(session["name"] for session in sessions),
+        "file_ids": list(file_ids),
+        "memory": None,
+        "chat_history": [],
+    })
+    load_frames = lambda: [(session["dataset_ref"]["key"], get_session_df(session)) for session in sessions]
+
+    st.subheader(f"Workspace: {current['name']}")
+    st.caption(" · ".join(f"dfs[{i}] = {session['name']}" for i, session in enumerate(sessions)))
+
+    if st.checkbox("Show Relationships"):
+        with st.spinner("Looking for join keys..."):
+            relationships = workspace_relationships(load_frames())
+        if relationships:
+            st.dataframe(pd.DataFrame([{
+                "left": f"{sessions[rel['left']]['name']}.{rel['left_column']}",
+                "right": f"{sessions[rel['right']]['name']}.{rel['right_column']}",
+                "matching values": f"{rel['overlap']:.0%}",
+                "matched by": rel["matched_by"],
+            } for rel in relationships]), use_container_width=True)
+        else:
+            st.info("No likely join keys found between these files.")
+
+    show_chat(chat_id, current, "+".join(keys), load_frames)
+
+def is_admin():
+    admins = st.secrets.get("ADMIN_USERS", [])
+    if isinstance(admins, str):
+        admins = [name.strip() for name in admins.split(",")]
+    return st.session_state.get("username") in admins
+
+def show_telemetry():
+    """Admin panel: answer cache counters, stage latencies and the slowest recent questions in this process"""
+    st.subheader("Telemetry")
+    cache = get_answer_cache().stats()
+    st.caption(
+        f"Answer cache: {cache['hit_rate']:.0%} hit rate · {cache['hits']} hits ({cache['memory_hits']} in memory) · "
+        f"{cache['misses']} misses · {cache['stores']} stored · {cache['entries']} entries in memory"
+    )
+    stats = telemetry.stage_stats()
+    if not stats:
+        st.info("Nothing has been traced yet.")
+        return
+    st.dataframe(pd.DataFrame([{
+        "stage": row["stage"],
+        "count": row["count"],
+        "errors": row["errors"],
+        "p50 ms": round(row["p50"] * 1000, 1),
+        "p95 ms": round(row["p95"] * 1000, 1),
+        "max ms": round(row["max"] * 1000, 1),
+    } for row in stats]), use_container_width=True, hide_index=True)
+
+    st.write("#### Slowest recent questions")
+    for trace in telemetry.slowest("query"):
+        attrs = trace["attrs"]
+        label = f"{trace['seconds']:.2f}s · {attrs.get('user')} · {attrs.get('question', '')[:80]}"
+        with st.expander(label):
+            if trace["error"]:
+                st.error(trace["error"])
+            st.dataframe(pd.DataFrame([{
+                "stage": child["name"],
+                "ms": round(child["seconds"] * 1000, 1),
+                "details": ", ".join(f"{key}={value}" for key, value in child["attrs"].items()),
+            } for child in trace["spans"]]), use_container_width=True, hide_index=True)
+    st.download_button("Download Prometheus metrics", telemetry.prometheus_text(), file_name="metrics.txt")
+
+def show_dashboard():
+    """Everything after login: file sidebar, preview, charts and chat"""
+    with st.sidebar:
+        st.header("Your Files")
+        uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
+        if uploaded_file:
+            file_id = upload_content_hash(uploaded_file)
+            if file_id not in st.session_state.file_sessions:
+                # Content already stored by any user is reused without parsing it again
+                st.session_state.file_sessions[file_id] = new_file_session(
+                    st.session_state.username, uploaded_file.name, file_id, lambda: parse_upload(uploaded_file)
+                )
+                st.session_state.writer.queue(file_session_update(file_id, st.session_state.file_sessions[file_id]))
+                st.session_state.writer.flush()
+            st.session_state.current_file_id = file_id
+
+        report = st.session_state.pop("last_ingest", None)
+        if report:
+            saved_pct = report["saved_bytes"] / report["raw_bytes"] if report["raw_bytes"] else 0
+            st.caption(
+                f"Loaded {report['rows']:,} rows in {report['seconds']}s · "
+                f"{report['optimized_bytes'] / 1e6:.1f} MB in memory ({saved_pct:.0%} smaller)"
+            )
+
+        st.markdown("### Your Files")
+        for fid, session in st.session_state.file_sessions.items():
+            for other_fid in list(st.session_state.file_sessions.keys()):
+                if other_fid != fid:
+                    st.session_state[f"menu_open_{other_fid}"] = False
+
+            menu_col, icon_col = st.columns([8, 1])
+
+            with menu_col:
+                file_label = f" {session['name']}"
+                st.markdown(f'<div class="file-entry">{file_label}</div>', unsafe_allow_html=True)
+                if session.get("meta"):
+                    chats = chat_count(session)
+                    st.caption(f"{session['meta']['rows']} rows × {session['meta']['columns']} columns"
+                               + (f" · {chats} chats" if chats is not None else ""))
+                if st.button("Load", key=f"load_{fid}"):
+                    st.session_state.current_file_id = fid
+                    st.session_state.workspace_files = []
+                    st.rerun()
+
+            with icon_col:
+                if st.button("⋮", key=f"menu_toggle_{fid}"):
+                    current_state = st.session_state.get(f"menu_open_{fid}", False)
+                    for k in list(st.session_state.file_sessions.keys()):
+                        st.session_state[f"menu_open_{k}"] = False
+                    st.session_state[f"menu_open_{fid}"] = not current_state
+
+            if st.session_state.get(f"menu_open_{fid}", False):
+                st.warning("Are you sure you want to delete this file?")
+                confirm_col1, confirm_col2 = st.columns([1, 1])
+                with confirm_col1:
+                    if st.button(" Yes, delete", key=f"confirm_yes_{fid}"):
+                        release_dataset(st.session_state.file_sessions.pop(fid).get("dataset_ref"),
+                                        dataset_holder(st.session_state.username, fid))
+                        st.session_state.writer.queue(delete_file_update(fid))
+                        st.session_state.writer.flush()
+                        if st.session_state.current_file_id == fid:
+                            st.session_state.current_file_id = next(iter(st.session_state.file_sessions), None)
+                        for chat_id, ws in list(st.session_state.workspaces.items()):
+                            if fid in ws["file_ids"]:
+                                del st.session_state.workspaces[chat_id]
+                        st.session_state.pop(f"menu_open_{fid}", None)
+                        st.rerun()
+                with confirm_col2:
+                    if st.button("Cancel", key=f"confirm_no_{fid}"):
+                        st.session_state.pop(f"menu_open_{fid}", None)
+                        st.rerun()
+
+        workspace = []
+        if len(st.session_state.file_sessions) > 1:
+            st.markdown("### Workspace")
+            # Drop files deleted since the last run before the widget reads its state
+            st.session_state.workspace_files = [
+                fid for fid in st.session_state.get("workspace_files", []) if fid in st.session_state.file_sessions
+            ]
+            workspace = st.multiselect(
+                "Ask across files", options=list(st.session_state.file_sessions),
+                format_func=lambda fid: st.session_state.file_sessions[fid]["name"], key="workspace_files",
+                help="Pick two or more files to ask questions that join or compare them.",
+            )
+
+        if (len(workspace) > 1 or st.session_state.current_file_id) and st.button("Clear Chat"):
+            if len(workspace) > 1:
+                chat = st.session_state.workspaces.get("+".join(sorted(workspace)), {})
+                chat["chat_history"] = []
+                chat["memory"] = None
+            else:
+                st.session_state.file_sessions[st.session_state.current_file_id]["chat_history"] = []
+                st.session_state.file_sessions[st.session_state.current_file_id]["memory"] = None
+                st.session_state.writer.queue(clear_chat_update(st.session_state.current_file_id))
+                st.session_state.writer.flush()
+            st.rerun()
+
+        show_admin = is_admin() and st.checkbox("Show Telemetry")
+
+    if show_admin:
+        show_telemetry()
+    elif len(workspace) > 1:
+        show_workspace(workspace)
+
+    elif st.session_state.current_file_id:
+        current = st.session_state.file_sessions[st.session_state.current_file_id]
+        ensure_dataset(st.session_state.current_file_id, current)
+        # Previews and charts may run in the SQL engine, so the frame is only loaded when needed
+        load_df = lambda: get_session_df(current)
+        profile = get_dataset_profile(current["dataset_ref"], load_df)
+        st.subheader(current['name'])
+
+        if st.checkbox("Show Data Preview"):
+            show_data_preview(current["dataset_ref"]["key"], load_df, profile)
+            st.write(f"**Shape:** {profile['rows']} rows × {len(profile['columns'])} columns")
+
+        if st.checkbox("Show Column Profile"):
+            st.dataframe(profile_table(profile), use_container_width=True)
+        
+        if st.checkbox("Show Graph"):
+            graph_type = st.selectbox("Select Graph Type", ["Line", "Bar", "Histogram", "Boxplot", "Scatter"])
+            numeric_columns = columns_of_kind(profile, "numeric")
+            all_columns = list(profile["columns"])
+
+            if not numeric_columns:
+                st.info("This file has no numeric columns to plot.")
+            elif graph_type in ["Line", "Bar", "Scatter", "Boxplot"]:
+                x_axis = st.selectbox("X-axis", options=all_columns)
+                # Default to a different column than X so the first chart isn't a column against itself
+                y_options = [col for col in numeric_columns if col != x_axis] + [col for col in numeric_columns if col == x_axis]
+                y_axis = st.selectbox("Y-axis", options=y_options)
+            elif graph_type == "Histogram":
+                x_axis = st.selectbox("Column", options=numeric_columns)
+                y_axis = None
+
+            if numeric_columns and st.button("Generate Graph"):
+                st.write(f"### {graph_type} Plot")
+                try:
+                    fig, note = build_graph(
+                        current["dataset_ref"]["key"], graph_type, x_axis, y_axis, load_df,
+                        {col: stats["kind"] for col, stats in profile["columns"].items()}
+                    )
+                    if note:
+                        st.caption(note)
+                    st.plotly_chart(fig, use_container_width=True)
+                except Exception as e:
+                    st.error(f"Error generating graph: {e}")
+
+        show_chat(st.session_state.current_file_id, current, current["dataset_ref"]["key"],
+                  lambda: [(current["dataset_ref"]["key"], load_df())], profile)
+
+    else:
+        st.info("Upload and select a CSV file to begin using Allytics.")
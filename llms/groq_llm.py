@@ -1,117 +1,335 @@
 import os
-import requests
+import re
+import json
 import time
+import asyncio
+import threading
+import requests
+from requests.adapters import HTTPAdapter
 from pandasai.llm.base import LLM
 from pandasai.helpers.logger import Logger
+from llms.rate_limiter import get_rate_limiter
+from llms.prompt_budget import PromptBudget, estimate_tokens
+from utils.telemetry import telemetry, span
+from utils.jobs import JobCancelled
+
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+MAX_RETRIES = 3
+
+_session_lock = threading.Lock()
+_sessions = {}
+
+
+def get_http_session(pool_connections=4, pool_maxsize=10):
+    """Process-wide keep-alive session, so every call reuses pooled TCP+TLS connections"""
+    key = (pool_connections, pool_maxsize)
+    with _session_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[key] = session
+        return session
 
 
 class GroqLLM(LLM):
-    def __init__(self, api_key=None, model="llama-3.1-8b-instant"):  # ✅ Changed to faster model
+    def __init__(self, api_key=None, model="llama-3.1-8b-instant",  # ✅ Changed to faster model
+                 timeout=30, pool_maxsize=10, max_concurrency=4, http2=True, rate_limiter=None,
+                 prompt_budget=None, base_url=None):
         
         import streamlit as st
         self.api_key = api_key or st.secrets.get("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("GROQ_API_KEY must be provided")
         
+        # Shared by every GroqLLM in the process (or on the host, with a state file)
+        self.rate_limiter = rate_limiter or get_rate_limiter(
+            requests_per_minute=int(st.secrets.get("GROQ_REQUESTS_PER_MINUTE", 30)),
+            tokens_per_minute=int(st.secrets.get("GROQ_TOKENS_PER_MINUTE", 6000)),
+            state_path=st.secrets.get("GROQ_RATE_LIMIT_FILE"),
+        )
+        
+        self.prompt_budget = prompt_budget or PromptBudget()
+        # Any OpenAI-compatible endpoint works, e.g. a local mock server for benchmarks
+        base_url = base_url or st.secrets.get("GROQ_BASE_URL") or os.environ.get("GROQ_BASE_URL") or GROQ_BASE_URL
+        self.api_url = base_url.rstrip("/") + "/chat/completions"
         self.model = model
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.max_concurrency = max_concurrency
+        self.http2 = http2
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        self._session = get_http_session(pool_maxsize=pool_maxsize)
         self._logger = Logger()
+        # When set, call() streams the completion and passes each text delta to it
+        self.on_token = None
 
     @property
     def type(self):
         return "groq"
 
+    def _prompt_text(self, instruction):
+        # Handle different instruction types
+        if hasattr(instruction, 'to_string'):
+            prompt_text = instruction.to_string()
+        elif hasattr(instruction, '__str__'):
+            prompt_text = str(instruction)
+        else:
+            prompt_text = instruction
+        
+        # Clean the prompt
+        prompt_text = prompt_text.strip()
+        if not prompt_text:
+            prompt_text = "Please provide a response."
+        return prompt_text
+
+    def _payload(self, prompt_text):
+        # More conservative payload for rate limiting
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt_text
+                }
+            ],
+            "temperature": 0.3,   # Lower temperature for faster processing
+            "max_tokens": self.prompt_budget.max_completion_tokens
+        }
+
+    def _prepare(self, instruction):
+        """Build the request payload from the compacted prompt, with token counts for accounting"""
+        prompt_text = self._prompt_text(instruction)
+        original_tokens = estimate_tokens(prompt_text)
+        prompt_text, prompt_tokens = self.prompt_budget.compact(prompt_text)
+        return self._payload(prompt_text), original_tokens, prompt_tokens
+
+    def _record_usage(self, result, original_tokens, prompt_tokens, started, reserved_tokens):
+        usage = result.get("usage") or {}
+        sent, completion = usage.get("prompt_tokens", prompt_tokens), usage.get("completion_tokens", 0)
+        if usage:
+            # The quota was charged for max_tokens; give back what the answer didn't use
+            self.rate_limiter.settle(reserved_tokens, sent + completion)
+        self.prompt_budget.record(original_tokens, sent, completion, time.perf_counter() - started)
+        telemetry.count("llm_tokens", sent, kind="prompt")
+        telemetry.count("llm_tokens", completion, kind="completion")
+        current = telemetry.current_span()
+        if current is not None:
+            current.set(prompt_tokens=sent, completion_tokens=completion)
+
+    def _rate_limit_wait(self, response):
+        # Prefer the Retry-After header, then the hint in the error message, then a default
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        wait_time = 3  # Default wait time
+        try:
+            error_data = self._safe_json(response)
+            error_msg = error_data.get('error', {}).get('message', '')
+            if 'Please try again in' in error_msg:
+                # Extract wait time from message
+                match = re.search(r'Please try again in (\d+\.?\d*)s', error_msg)
+                if match:
+                    wait_time = float(match.group(1)) + 1  # Add 1 second buffer
+        except:
+            pass
+        return wait_time
+
+    def _parse_response(self, status_code, text, result):
+        if status_code != 200:
+            error_msg = f"Groq API error {status_code}: {text}"
+            self._logger.log(error_msg)
+            raise Exception(error_msg)
+        
+        if "choices" not in result or not result["choices"]:
+            raise Exception("Invalid response from Groq API")
+        
+        return result["choices"][0]["message"]["content"].strip()
+
+    @staticmethod
+    def _safe_json(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def _read_stream(self, response, on_token):
+        """Consume a server-sent-events completion, returning the full text and usage"""
+        parts, usage = [], {}
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            # Groq reports usage on the last chunk under x_groq; OpenAI-style servers use usage
+            usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    on_token(delta)
+        return "".join(parts).strip(), usage
+
     def call(self, instruction, context=None):
         """
         Make API call to Groq with rate limit handling
         """
-        max_retries = 3
+        return self._complete(instruction, self.on_token)
+
+    def _complete(self, instruction, on_token=None):
+        with span("llm.prepare") as prepare_span:
+            payload, original_tokens, prompt_tokens = self._prepare(instruction)
+            prepare_span.set(original_tokens=original_tokens, prompt_tokens=prompt_tokens)
+        if on_token is not None:
+            payload["stream"] = True
+        # Quota is charged for the prompt plus the completion we allow
+        estimated_tokens = prompt_tokens + payload["max_tokens"]
+        started = time.perf_counter()
+        max_retries = MAX_RETRIES
         for attempt in range(max_retries):
             try:
-                # Handle different instruction types
-                if hasattr(instruction, 'to_string'):
-                    prompt_text = instruction.to_string()
-                elif hasattr(instruction, '__str__'):
-                    prompt_text = str(instruction)
-                else:
-                    prompt_text = instruction
-                
-                # Clean the prompt
-                prompt_text = prompt_text.strip()
-                if not prompt_text:
-                    prompt_text = "Please provide a response."
-                
-                # More conservative payload for rate limiting
-                payload = {
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt_text
-                        }
-                    ],
-                    "temperature": 0.3,   # Lower temperature for faster processing
-                    "max_tokens": 512     #  Reduced token limit to avoid rate limits
-                }
-                
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                response = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=30
-                )
-                
-                # Handle rate limiting
-                if response.status_code == 429:
-                    if attempt < max_retries - 1:
-                        # Extract wait time from error message or use default
-                        wait_time = 3  # Default wait time
-                        try:
-                            error_data = response.json()
-                            error_msg = error_data.get('error', {}).get('message', '')
-                            if 'Please try again in' in error_msg:
-                                # Extract wait time from message
-                                import re
-                                match = re.search(r'Please try again in (\d+\.?\d*)s', error_msg)
-                                if match:
-                                    wait_time = float(match.group(1)) + 1  # Add 1 second buffer
-                        except:
-                            pass
-                        
-                        print(f"Rate limit hit. Waiting {wait_time} seconds... (Attempt {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        raise Exception("Rate limit exceeded. Please wait a moment and try again.")
-                
-                # Other error handling
-                if response.status_code != 200:
-                    error_msg = f"Groq API error {response.status_code}: {response.text}"
-                    self._logger.log(error_msg)
-                    raise Exception(error_msg)
-                
-                result = response.json()
-                
-                if "choices" not in result or not result["choices"]:
-                    raise Exception("Invalid response from Groq API")
-                
-                return result["choices"][0]["message"]["content"].strip()
-                
+                # Wait our turn for quota instead of firing and sleeping after a 429; includes backoff pauses
+                with span("llm.quota_wait", attempt=attempt, tokens=estimated_tokens):
+                    self.rate_limiter.acquire(estimated_tokens)
+                with span("llm.attempt", attempt=attempt, model=self.model, stream=on_token is not None) as attempt_span:
+                    # Closed on every exit, so a stream abandoned part way (cancelled from on_token, or
+                    # a malformed chunk) doesn't keep its pooled connection checked out
+                    with self._session.post(
+                        self.api_url,
+                        headers=self._headers,
+                        json=payload,
+                        timeout=self.timeout,
+                        stream=on_token is not None
+                    ) as response:
+                        self.rate_limiter.update_from_headers(response.headers)
+                        attempt_span.set(status=response.status_code)
+
+                        # Handle rate limiting
+                        if response.status_code == 429:
+                            telemetry.count("llm_rate_limited")
+                            if attempt < max_retries - 1:
+                                wait_time = self.rate_limiter.backoff(attempt, self._rate_limit_wait(response))
+                                attempt_span.set(backoff_seconds=round(wait_time, 3))
+                                print(f"Rate limit hit. Backing off {wait_time:.1f} seconds... (Attempt {attempt + 1}/{max_retries})")
+                                continue
+                            else:
+                                raise Exception("Rate limit exceeded. Please wait a moment and try again.")
+
+                        if on_token is not None and response.status_code == 200:
+                            content, usage = self._read_stream(response, on_token)
+                            self._record_usage({"usage": usage}, original_tokens, prompt_tokens, started, estimated_tokens)
+                            attempt_span.set(response_chars=len(content))
+                            return content
+
+                        result = self._safe_json(response)
+                        attempt_span.set(response_bytes=len(response.content))
+                        content = self._parse_response(response.status_code, response.text, result)
+                        self._record_usage(result, original_tokens, prompt_tokens, started, estimated_tokens)
+                        return content
+
+            except JobCancelled:
+                # Raised by on_token when the job was cancelled; the caller needs to see it as such
+                raise
             except Exception as e:
                 if "rate_limit_exceeded" in str(e) or "429" in str(e):
                     if attempt < max_retries - 1:
-                        wait_time = 3 * (attempt + 1)  # Exponential backoff
-                        print(f"Rate limit error. Waiting {wait_time} seconds... (Attempt {attempt + 1}/{max_retries})")
-                        time.sleep(wait_time)
+                        wait_time = self.rate_limiter.backoff(attempt + 1)  # Jittered exponential backoff
+                        print(f"Rate limit error. Backing off {wait_time:.1f} seconds... (Attempt {attempt + 1}/{max_retries})")
                         continue
                 
                 self._logger.log(f"GroqLLM error: {str(e)}")
                 raise Exception(f"GroqLLM Error: {str(e)}")
 
+    def _async_client(self):
+        import httpx
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx needs it for HTTP/2)
+            except ImportError:
+                http2 = False
+        limits = httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+        return httpx.AsyncClient(http2=http2, limits=limits, timeout=self.timeout, headers=self._headers)
+
+    async def acall(self, instruction, context=None, client=None):
+        """
+        Async version of call. Uses httpx (HTTP/2 when h2 is installed) and falls
+        back to running the pooled sync call in a worker thread without it.
+        """
+        try:
+            import httpx  # noqa: F401
+        except ImportError:
+            return await asyncio.to_thread(self.call, instruction, context)
+
+        if client is None:
+            async with self._async_client() as own_client:
+                return await self.acall(instruction, context, client=own_client)
+
+        payload, original_tokens, prompt_tokens = self._prepare(instruction)
+        # Quota is charged for the prompt plus the completion we allow
+        estimated_tokens = prompt_tokens + payload["max_tokens"]
+        started = time.perf_counter()
+        max_retries = MAX_RETRIES
+        for attempt in range(max_retries):
+            with span("llm.quota_wait", attempt=attempt, tokens=estimated_tokens):
+                await self.rate_limiter.aacquire(estimated_tokens)
+            try:
+                with span("llm.attempt", attempt=attempt, model=self.model, stream=False) as attempt_span:
+                    response = await client.post(self.api_url, json=payload)
+                    attempt_span.set(status=response.status_code, response_bytes=len(response.content))
+            except Exception as e:
+                self._logger.log(f"GroqLLM error: {str(e)}")
+                raise Exception(f"GroqLLM Error: {str(e)}")
+            self.rate_limiter.update_from_headers(response.headers)
+            if response.status_code == 429:
+                telemetry.count("llm_rate_limited")
+                if attempt < max_retries - 1:
+                    self.rate_limiter.backoff(attempt, self._rate_limit_wait(response))
+                    continue
+                raise Exception("GroqLLM Error: Rate limit exceeded. Please wait a moment and try again.")
+            try:
+                result = self._safe_json(response)
+                content = self._parse_response(response.status_code, response.text, result)
+                self._record_usage(result, original_tokens, prompt_tokens, started, estimated_tokens)
+                return content
+            except Exception as e:
+                self._logger.log(f"GroqLLM error: {str(e)}")
+                raise Exception(f"GroqLLM Error: {str(e)}")
+
+    async def abatch(self, instructions, max_concurrency=None):
+        """Run several prompts at once over one shared connection pool, keeping input order"""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        try:
+            import httpx  # noqa: F401
+            client = self._async_client()
+        except ImportError:
+            client = None
+
+        async def run(instruction):
+            async with semaphore:
+                return await self.acall(instruction, client=client)
+
+        try:
+            return await asyncio.gather(*(run(i) for i in instructions))
+        finally:
+            if client is not None:
+                await client.aclose()
+
+    def batch(self, instructions, max_concurrency=None):
+        """Blocking wrapper around abatch for callers without an event loop"""
+        return asyncio.run(self.abatch(instructions, max_concurrency))
+
 # Test function
 def test_groq_connection():
     """Test Groq API connection"""
@@ -0,0 +1,170 @@
+import re
+import itertools
+import threading
+from collections import OrderedDict, deque
+
+CHARS_PER_TOKEN = 4
+SAMPLE_VALUES = 3
+MAX_VALUE_CHARS = 30
+MAX_CACHED_SUMMARIES = 256
+
+_DATAFRAME_BLOCK = re.compile(r"(<dataframe[^>]*>)(.*?)(</dataframe>)", re.DOTALL)
+_CONVERSATION_BLOCK = re.compile(r"(<conversation>)(.*?)(</conversation>)", re.DOTALL)
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token for English and code)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _short(value):
+    text = str(value)
+    return text if len(text) <= MAX_VALUE_CHARS else text[:MAX_VALUE_CHARS - 1] + "…"
+
+
+def _describe_column(series):
+    non_null = series.dropna()
+    nulls = len(series) - len(non_null)
+    unique = non_null.nunique()
+    parts = [str(series.dtype), f"{unique} unique"]
+    if nulls:
+        parts.append(f"{nulls} nulls")
+    if non_null.empty:
+        return ", ".join(parts)
+    if series.dtype.kind in "iufM":
+        parts.append(f"range {_short(non_null.min())} to {_short(non_null.max())}")
+    else:
+        top = non_null.value_counts().head(SAMPLE_VALUES).index
+        parts.append("e.g. " + ", ".join(repr(_short(v)) for v in top))
+    return ", ".join(parts)
+
+
+def _describe_profiled_column(stats):
+    parts = [stats["dtype"], f"{stats['unique']} unique"]
+    if stats["nulls"]:
+        parts.append(f"{stats['nulls']} nulls")
+    if "min" in stats:
+        parts.append(f"range {_short(stats['min'])} to {_short(stats['max'])}")
+    elif stats.get("top"):
+        parts.append("e.g. " + ", ".join(repr(_short(v)) for v, _ in stats["top"][:SAMPLE_VALUES]))
+    return ", ".join(parts)
+
+
+def schema_summary(key, df, profile=None):
+    """
+    Compact description of a DataFrame (shape, dtypes, cardinalities, sample values),
+    cached per dataset key so it is computed once per file. Uses the precomputed
+    column profile when one is given instead of scanning the frame.
+    """
+    with _summaries_lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+
+    if profile is not None:
+        lines = [f"{profile['rows']} rows x {len(profile['columns'])} columns"]
+        for col, stats in profile["columns"].items():
+            lines.append(f"- {col}: {_describe_profiled_column(stats)}")
+    else:
+        lines = [f"{df.shape[0]} rows x {df.shape[1]} columns"]
+        for col in df.columns:
+            lines.append(f"- {col}: {_describe_column(df[col])}")
+    summary = "\n".join(lines)
+
+    with _summaries_lock:
+        _summaries[key] = summary
+        while len(_summaries) > MAX_CACHED_SUMMARIES:
+            _summaries.popitem(last=False)
+    return summary
+
+
+class PromptBudget:
+    """
+    Sits between the pandasai Agent and GroqLLM: swaps the CSV head samples in the
+    prompt for cached schema summaries, trims conversation memory to a token budget
+    and records token usage per call.
+    """
+
+    def __init__(self, max_prompt_tokens=3000, max_conversation_tokens=600,
+                 max_completion_tokens=512, history_size=200):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_conversation_tokens = max_conversation_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.frames = []
+        self.calls = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def register(self, frames, profiles=None):
+        """
+        frames: (dataset key, DataFrame) pairs in the order the Agent receives them;
+        profiles: optional {dataset key: column profile} used for the summaries
+        """
+        profiles = profiles or {}
+        self.frames = [(key, schema_summary(key, df, profiles.get(key))) for key, df in frames]
+        return self
+
+    def _replace_dataframes(self, prompt_text):
+        index = itertools.count()
+
+        def replace(match):
+            i = next(index)
+            if i >= len(self.frames):
+                return match.group(0)
+            return f"{match.group(1)}\ndfs[{i}]: {self.frames[i][1]}\n{match.group(3)}"
+
+        return _DATAFRAME_BLOCK.sub(replace, prompt_text)
+
+    def _trim_conversation(self, prompt_text):
+        def trim(match):
+            lines = match.group(2).strip("\n").split("\n")
+            kept, used = [], 0
+            # Keep the most recent messages that fit the budget
+            for line in reversed(lines):
+                cost = estimate_tokens(line)
+                if kept and used + cost > self.max_conversation_tokens:
+                    break
+                kept.append(line)
+                used += cost
+            return f"{match.group(1)}\n" + "\n".join(reversed(kept)) + f"\n{match.group(3)}"
+
+        return _CONVERSATION_BLOCK.sub(trim, prompt_text)
+
+    def compact(self, prompt_text):
+        """Return the prompt to send and its estimated token count"""
+        if self.frames:
+            prompt_text = self._replace_dataframes(prompt_text)
+        prompt_text = self._trim_conversation(prompt_text)
+        tokens = estimate_tokens(prompt_text)
+        if tokens > self.max_prompt_tokens:
+            # Still too long: keep the start (instructions, schema) and the end (the question)
+            keep = self.max_prompt_tokens * CHARS_PER_TOKEN // 2
+            prompt_text = prompt_text[:keep] + "\n...\n" + prompt_text[-keep:]
+            tokens = estimate_tokens(prompt_text)
+        return prompt_text, tokens
+
+    def record(self, original_tokens, prompt_tokens, completion_tokens, seconds):
+        with self._lock:
+            self.calls.append({
+                "original_tokens": original_tokens,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "seconds": round(seconds, 3),
+            })
+
+    def stats(self):
+        with self._lock:
+            calls = list(self.calls)
+        if not calls:
+            return {"calls": 0}
+        original = sum(c["original_tokens"] for c in calls)
+        sent = sum(c["prompt_tokens"] for c in calls)
+        return {
+            "calls": len(calls),
+            "prompt_tokens": sent,
+            "completion_tokens": sum(c["completion_tokens"] for c in calls),
+            "prompt_tokens_saved": max(original - sent, 0),
+            "avg_seconds": round(sum(c["seconds"] for c in calls) / len(calls), 3),
+        }
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 6000
+MAX_BACKOFF_SECONDS = 60
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value):
+    """Parse Groq's reset headers such as '7.66s', '2m59.56s' or '250ms' into seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class _MemoryState:
+    """Bucket state shared by every thread in this process"""
+
+    def __init__(self, initial):
+        self._state = dict(initial)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            yield self._state
+
+
+class _FileState:
+    """Bucket state in a locked JSON file, shared by every worker process on the host"""
+
+    def __init__(self, path, initial):
+        self.path = path
+        self.initial = dict(initial)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self):
+        import fcntl
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw else dict(self.initial)
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    Client-side token buckets for requests and tokens per minute.
+    Callers queue in arrival order, and a 429 or exhausted quota header pauses
+    every caller sharing the limiter instead of letting each one retry on its own.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, state_path=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        initial = {
+            "requests": float(requests_per_minute),
+            "tokens": float(tokens_per_minute),
+            "updated": time.time(),
+            "paused_until": 0.0,
+        }
+        self._state = _FileState(state_path, initial) if state_path else _MemoryState(initial)
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self, state, now):
+        elapsed = max(now - state["updated"], 0.0)
+        state["requests"] = min(self.requests_per_minute, state["requests"] + elapsed * self.requests_per_minute / 60)
+        state["tokens"] = min(self.tokens_per_minute, state["tokens"] + elapsed * self.tokens_per_minute / 60)
+        state["updated"] = now
+
+    def _reserve(self, tokens):
+        """Take capacity if available; otherwise return how long to wait before trying again"""
+        # A single prompt larger than the whole bucket would otherwise wait forever
+        tokens = min(tokens, self.tokens_per_minute)
+        with self._state.transaction() as state:
+            now = time.time()
+            self._refill(state, now)
+            if now < state["paused_until"]:
+                return state["paused_until"] - now
+            if state["requests"] >= 1 and state["tokens"] >= tokens:
+                state["requests"] -= 1
+                state["tokens"] -= tokens
+                return 0.0
+            wait_requests = (1 - state["requests"]) * 60 / self.requests_per_minute
+            wait_tokens = (tokens - state["tokens"]) * 60 / self.tokens_per_minute
+            return max(wait_requests, wait_tokens, 0.01)
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until one request carrying `tokens` tokens may be sent (FIFO among waiting threads)"""
+        deadline = None if timeout is None else time.time() + timeout
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    if self._queue[0] is ticket:
+                        wait = self._reserve(tokens)
+                        if wait == 0:
+                            return True
+                    else:
+                        wait = None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            return False
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    async def aacquire(self, tokens=1):
+        """Async counterpart of acquire for the event-loop based client"""
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0:
+                return True
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved_tokens, used_tokens):
+        """
+        Return the part of a reservation a finished request did not use. Requests reserve
+        their prompt plus the maximum completion, and most answers are far shorter.
+        """
+        unused = min(reserved_tokens, self.tokens_per_minute) - used_tokens
+        if unused <= 0:
+            return
+        with self._state.transaction() as state:
+            self._refill(state, time.time())
+            state["tokens"] = min(self.tokens_per_minute, state["tokens"] + unused)
+        with self._cond:
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers):
+        """Align the buckets with what the API reports is actually left in the window"""
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        pause = 0.0
+        with self._state.transaction() as state:
+            self._refill(state, time.time())
+            if remaining_tokens is not None:
+                try:
+                    state["tokens"] = min(state["tokens"], float(remaining_tokens))
+                except ValueError:
+                    pass
+                if state["tokens"] <= 0:
+                    pause = parse_reset_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0
+            if remaining_requests is not None and str(remaining_requests) == "0":
+                pause = max(pause, parse_reset_duration(headers.get("x-ratelimit-reset-requests")) or 0.0)
+        if pause:
+            self.pause(pause)
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Jittered exponential backoff after a refusal. The pause applies to everyone
+        sharing this limiter, and the returned delay is only informational.
+        """
+        delay = random.uniform(0, min(MAX_BACKOFF_SECONDS, 2 ** attempt))
+        if retry_after is not None:
+            delay += retry_after
+        self.pause(delay)
+        return delay
+
+    def pause(self, seconds):
+        with self._state.transaction() as state:
+            state["paused_until"] = max(state["paused_until"], time.time() + seconds)
+        with self._cond:
+            self._cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                     tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, state_path=None):
+    """One limiter per configuration, shared by every session in the process"""
+    key = (requests_per_minute, tokens_per_minute, state_path and os.path.abspath(state_path))
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute, state_path)
+        return _limiters[key]
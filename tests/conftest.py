@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the app's modules the same way app.py does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_db(tmp_path_factory):
+    """utils.db against an in-memory MongoDB and a local dataset directory"""
+    pytest.importorskip("mongomock")
+    from benchmarks.sandbox import configure
+    workdir = tmp_path_factory.mktemp("app")
+    cwd = os.getcwd()
+    # st.secrets is read from the working directory the first time it is used
+    configure(str(workdir), {"MONGO_URI": "mongomock://", "DATASET_STORE": "local",
+                             "DATASET_DIR": str(workdir / "data")})
+    try:
+        from utils import db
+        db.get_db()
+    finally:
+        os.chdir(cwd)
+    return db
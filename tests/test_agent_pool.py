@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from utils.agent_pool import AgentPool
+
+
+def fake_factory(key, frames):
+    connectors = [SimpleNamespace(pandas_df=df) for _, df in frames]
+    agent = SimpleNamespace(context=SimpleNamespace(memory=None, dfs=connectors))
+    return agent, SimpleNamespace(on_token=None)
+
+
+@pytest.fixture
+def cow():
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+def test_same_key_shares_one_agent():
+    pool = AgentPool(fake_factory)
+    load = lambda: [("k", pd.DataFrame({"a": [1]}))]
+    with pool.lease("k", load, "m1") as (first, _):
+        assert first.context.memory == "m1"
+    with pool.lease("k", load, "m2") as (second, _):
+        assert second is first
+    assert first.context.memory is None
+    assert len(pool) == 1
+
+
+def test_generated_code_cannot_change_shared_frame(cow):
+    shared = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    pool = AgentPool(fake_factory)
+    with pool.lease("k", lambda: [("k", shared)], None) as (agent, _):
+        df = agent.context.dfs[0].pandas_df
+        assert df is not shared
+        df.loc[0, "a"] = 100
+        df["c"] = 1
+        df.drop(columns="b", inplace=True)
+    assert shared.equals(pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}))
+    assert agent.context.dfs[0].pandas_df is shared
+    with pool.lease("k", lambda: [("k", shared)], None) as (agent, _):
+        assert list(agent.context.dfs[0].pandas_df.columns) == ["a", "b"]
+
+
+def test_idle_agents_are_evicted_beyond_max():
+    pool = AgentPool(fake_factory, max_agents=2)
+    for key in "abc":
+        with pool.lease(key, lambda: [(key, pd.DataFrame())], None):
+            pass
+    assert len(pool) == 2
@@ -0,0 +1,60 @@
+import mongomock
+import pytest
+
+from utils.answer_cache import AnswerCache, normalize_question
+from utils.telemetry import telemetry
+
+ANSWER = {"type": "text", "content": "42"}
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.answer_cache
+
+
+def test_normalize_question():
+    assert normalize_question("  How many   ROWS?? ") == "how many rows"
+
+
+def test_key_depends_on_data_question_and_context():
+    cache = AnswerCache()
+    key = cache.make_key("data", "How many rows?")
+    assert key == cache.make_key("data", "how many rows")
+    assert key != cache.make_key("other", "How many rows?")
+    assert key != cache.make_key("data", "How many rows?", ["And columns?"])
+
+
+def test_hit_and_miss_counters(collection):
+    cache = AnswerCache(collection)
+    key = cache.make_key("data", "How many rows?")
+    assert cache.get(key) is None
+    cache.put(key, ANSWER)
+    assert cache.get(key) == ANSWER
+    # A new process still finds the answer in MongoDB
+    assert AnswerCache(collection).get(key) == ANSWER
+    stats = cache.stats()
+    assert (stats["hits"], stats["memory_hits"], stats["misses"], stats["stores"]) == (1, 1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+    assert "allytics_answer_cache_hits_total" in telemetry.prometheus_text()
+
+
+def test_failed_answers_are_not_cached(collection):
+    cache = AnswerCache(collection)
+    key = cache.make_key("data", "Plot it")
+    cache.put(key, {"type": "text", "content": "Unfortunately, I was not able to answer."})
+    assert cache.get(key) is None
+    assert collection.count_documents({}) == 0
+
+
+def test_memory_entries_are_bounded():
+    cache = AnswerCache(max_entries=2)
+    for i in range(3):
+        cache.put(str(i), ANSWER)
+    assert cache.get("0") is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_changed_ttl_rebuilds_the_index(collection):
+    AnswerCache(collection, ttl_seconds=60)
+    AnswerCache(collection, ttl_seconds=120)
+    assert collection.index_information()["created_at_1"]["expireAfterSeconds"] == 120
@@ -0,0 +1,36 @@
+import os
+import time
+
+import pandas as pd
+
+from utils.artifacts import ArtifactStore
+from utils.dataset_store import LocalBlobBackend, make_dataset_store
+
+
+def test_saving_an_existing_chart_refreshes_it(tmp_path):
+    backend = LocalBlobBackend(str(tmp_path / "artifacts"))
+    store = ArtifactStore(backend, max_age_seconds=3600)
+    key = store._put(b"chart")
+    old = time.time() - 7200
+    os.utime(backend.path(key), (old, old))
+
+    assert store._put(b"chart") == key
+    assert store.evict() == 0
+    assert store.load(key) == b"chart"
+
+
+def test_evict_drops_charts_past_the_age_limit(tmp_path):
+    backend = LocalBlobBackend(str(tmp_path / "artifacts"))
+    store = ArtifactStore(backend, max_age_seconds=3600)
+    key = store._put(b"chart")
+    old = time.time() - 7200
+    os.utime(backend.path(key), (old, old))
+
+    assert store.evict() == 1
+    assert store.load(key) is None
+
+
+def test_local_datasets_live_directly_in_the_dataset_dir(tmp_path):
+    store = make_dataset_store(None, kind="local", root=str(tmp_path))
+    ref = store.save(pd.DataFrame({"a": [1, 2]}), key="abc")
+    assert os.path.exists(tmp_path / ref["key"])
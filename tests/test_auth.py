@@ -0,0 +1,63 @@
+import pytest
+
+from utils.auth import (hash_password, verify_password, is_password_hash, needs_rehash,
+                        issue_session_token, verify_session_token, new_session_id)
+
+SECRET = "test-secret"
+FAST_METHOD = "pbkdf2:sha256:1000"
+
+
+def test_password_round_trip():
+    hashed = hash_password("hunter2", FAST_METHOD)
+    assert is_password_hash(hashed)
+    assert verify_password("hunter2", hashed)
+    assert not verify_password("hunter3", hashed)
+
+
+def test_plaintext_password_is_not_a_hash():
+    assert not is_password_hash("hunter2")
+    assert not is_password_hash("a$b$c")
+
+
+def test_needs_rehash_when_cost_changes():
+    hashed = hash_password("hunter2", FAST_METHOD)
+    assert not needs_rehash(hashed, FAST_METHOD)
+    assert not needs_rehash(hashed, "pbkdf2")
+    assert needs_rehash(hashed, "pbkdf2:sha256:2000")
+    assert needs_rehash(hashed, "scrypt")
+
+
+def test_token_round_trip():
+    session_id = new_session_id()
+    claims = verify_session_token(issue_session_token("ann", "Ann", SECRET, 60, session_id=session_id), SECRET)
+    assert (claims["u"], claims["n"], claims["sid"]) == ("ann", "Ann", session_id)
+
+
+@pytest.mark.parametrize("token", [None, "", "garbage", "abc.def"])
+def test_malformed_tokens_are_rejected(token):
+    assert verify_session_token(token, SECRET) is None
+
+
+def test_token_signed_with_another_secret_is_rejected():
+    assert verify_session_token(issue_session_token("ann", "Ann", "other", 60), SECRET) is None
+
+
+def test_tampered_token_is_rejected():
+    signature = issue_session_token("ann", "Ann", SECRET, 60).partition(".")[2]
+    forged = issue_session_token("root", "Root", "other", 60).partition(".")[0]
+    assert verify_session_token(f"{forged}.{signature}", SECRET) is None
+
+
+def test_expired_token_is_rejected():
+    assert verify_session_token(issue_session_token("ann", "Ann", SECRET, -1), SECRET) is None
+
+
+def test_logout_revokes_the_login_session(app_db):
+    session_id = app_db.create_login_session("ann", 60)
+    assert app_db.extend_login_session(session_id, 60)
+    app_db.end_login_session(session_id)
+    assert not app_db.extend_login_session(session_id, 60)
+
+
+def test_expired_login_session_cannot_be_extended(app_db):
+    assert not app_db.extend_login_session(app_db.create_login_session("ann", -1), 60)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.chart_data import MAX_CATEGORIES, MAX_POINTS, lttb, reduced_chart
+
+GRAPH_TYPES = ["Line", "Bar", "Boxplot", "Scatter"]
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "Sales": rng.gamma(2.0, 10.0, 1000),
+        "Region": rng.choice(["North", "South", "East"], 1000),
+        "Units": rng.integers(1, 10, 1000),
+    })
+
+
+@pytest.mark.parametrize("graph_type", GRAPH_TYPES)
+def test_same_column_on_both_axes(sales, graph_type):
+    fig, _ = reduced_chart(sales, graph_type, "Sales", "Sales")
+    assert len(fig.data) == 1
+
+
+@pytest.mark.parametrize("graph_type", GRAPH_TYPES)
+def test_categorical_x(sales, graph_type):
+    fig, _ = reduced_chart(sales, graph_type, "Region", "Sales")
+    assert len(fig.data) == 1
+
+
+def test_bar_sums_per_group(sales):
+    fig, _ = reduced_chart(sales, "Bar", "Region", "Units")
+    expected = sales.groupby("Region")["Units"].sum()
+    assert list(fig.data[0].x) == list(expected.index)
+    assert list(fig.data[0].y) == list(expected)
+
+
+def test_line_over_many_categories_is_capped():
+    df = pd.DataFrame({"name": [f"n{i}" for i in range(20_000)], "v": np.arange(20_000.0)})
+    fig, note = reduced_chart(df, "Line", "name", "v")
+    assert len(fig.data[0].x) == MAX_CATEGORIES
+    assert note
+
+
+def test_long_line_is_downsampled():
+    x = np.arange(100_000)
+    fig, note = reduced_chart(pd.DataFrame({"x": x, "y": np.sin(x / 100)}), "Line", "x", "y")
+    assert len(fig.data[0].x) == MAX_POINTS
+    assert "LTTB" in note
+
+
+def test_lttb_keeps_endpoints_and_peak():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[500] = 10.0
+    idx = lttb(x, y, 50)
+    assert idx[0] == 0 and idx[-1] == 999
+    assert 500 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+@pytest.fixture
+def sql_sales(tmp_path, sales):
+    pytest.importorskip("duckdb")
+    from utils.dataset_store import LocalBlobBackend
+    from utils.sql_engine import DuckDBEngine
+
+    backend = LocalBlobBackend(str(tmp_path / "data"))
+    sales.to_parquet(backend.path("sales"), index=False)
+    return DuckDBEngine(backend, str(tmp_path / "spill"))
+
+
+@pytest.mark.parametrize("graph_type", GRAPH_TYPES)
+def test_sql_same_column_on_both_axes(sql_sales, graph_type):
+    from utils.chart_data import reduced_chart_sql
+
+    kinds = {"Sales": "numeric", "Region": "categorical", "Units": "numeric"}
+    fig, _ = reduced_chart_sql(sql_sales, "sales", graph_type, "Sales", "Sales", kinds)
+    assert len(fig.data) == 1
+
+
+def test_sql_line_over_many_categories_is_capped(tmp_path):
+    pytest.importorskip("duckdb")
+    from utils.chart_data import reduced_chart_sql
+    from utils.dataset_store import LocalBlobBackend
+    from utils.sql_engine import DuckDBEngine
+
+    backend = LocalBlobBackend(str(tmp_path / "data"))
+    pd.DataFrame({"name": [f"n{i}" for i in range(20_000)], "v": np.arange(20_000.0)}).to_parquet(backend.path("k"))
+    engine = DuckDBEngine(backend, str(tmp_path / "spill"))
+    fig, note = reduced_chart_sql(engine, "k", "Line", "name", "v", {"name": "categorical", "v": "numeric"})
+    assert len(fig.data[0].x) == MAX_CATEGORIES
+    assert note
@@ -0,0 +1,70 @@
+import uuid
+
+import pandas as pd
+import pytest
+
+
+def frame():
+    return pd.DataFrame({"region": ["North", "South"], "amount": [1.5, 2.5]})
+
+
+def holders(db, key):
+    return db.datasets_collection().find_one({"_id": key})["holders"]
+
+
+def test_two_tabs_take_one_reference_per_file_session(app_db):
+    key = uuid.uuid4().hex
+    first = app_db.new_file_session("ann", "a.csv", key, frame)
+    second = app_db.new_file_session("ann", "a.csv", key, lambda: pytest.fail("parsed twice"))
+    assert first["dataset_ref"] == second["dataset_ref"]
+    assert holders(app_db, key) == [app_db.dataset_holder("ann", key)]
+
+    # Deleting the file in both tabs releases the reference once
+    app_db.new_file_session("bob", "b.csv", key, frame)
+    app_db.release_dataset(first["dataset_ref"], app_db.dataset_holder("ann", key))
+    app_db.release_dataset(second["dataset_ref"], app_db.dataset_holder("ann", key))
+    assert holders(app_db, key) == [app_db.dataset_holder("bob", key)]
+    assert app_db.get_session_df(first).equals(frame())
+
+
+def test_last_release_deletes_the_blob(app_db):
+    key = uuid.uuid4().hex
+    session = app_db.new_file_session("ann", "a.csv", key, frame)
+    app_db.release_dataset(session["dataset_ref"], app_db.dataset_holder("ann", key))
+    assert app_db.datasets_collection().find_one({"_id": key}) is None
+    assert not app_db.get_dataset_store().backend.exists(key)
+
+
+def test_upload_waits_for_a_release_in_progress(app_db, monkeypatch):
+    key = uuid.uuid4().hex
+    app_db.datasets_collection().insert_one({"_id": key, "state": app_db.DATASET_RELEASING,
+                                             "state_at": app_db.datetime.now(app_db.timezone.utc), "holders": []})
+
+    def release_finishes(seconds):
+        app_db.datasets_collection().delete_one({"_id": key})
+    monkeypatch.setattr(app_db.time, "sleep", release_finishes)
+
+    session = app_db.new_file_session("ann", "a.csv", key, frame)
+    assert holders(app_db, key) == [app_db.dataset_holder("ann", key)]
+    assert app_db.get_session_df(session).equals(frame())
+
+
+def test_upload_takes_over_a_release_that_died(app_db):
+    key = uuid.uuid4().hex
+    long_ago = app_db.datetime.now(app_db.timezone.utc) - app_db.timedelta(hours=1)
+    app_db.datasets_collection().insert_one({"_id": key, "state": app_db.DATASET_RELEASING,
+                                             "state_at": long_ago, "holders": []})
+    session = app_db.new_file_session("ann", "a.csv", key, frame)
+    doc = app_db.datasets_collection().find_one({"_id": key})
+    assert "state" not in doc and doc["holders"] == [app_db.dataset_holder("ann", key)]
+    assert app_db.get_session_df(session).equals(frame())
+
+
+def test_failed_parse_leaves_no_dataset_behind(app_db):
+    key = uuid.uuid4().hex
+
+    def broken():
+        raise ValueError("not a CSV")
+    with pytest.raises(ValueError):
+        app_db.new_file_session("ann", "a.csv", key, broken)
+    assert app_db.datasets_collection().find_one({"_id": key}) is None
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("pandasai")
+
+from benchmarks.mock_groq import DEFAULT_REPLY, MockSettings, start_mock_server  # noqa: E402
+from llms.groq_llm import GroqLLM  # noqa: E402
+from llms.rate_limiter import RateLimiter  # noqa: E402
+from utils.jobs import JobCancelled  # noqa: E402
+
+
+@pytest.fixture
+def mock_api():
+    server, base_url = start_mock_server(MockSettings(latency_ms=0, jitter_ms=0))
+    yield base_url
+    server.shutdown()
+
+
+def make_llm(base_url):
+    return GroqLLM(api_key="test", base_url=base_url,
+                   rate_limiter=RateLimiter(requests_per_minute=10000, tokens_per_minute=10_000_000))
+
+
+def test_call_returns_completion(mock_api):
+    assert make_llm(mock_api).call("How many rows?") == DEFAULT_REPLY
+
+
+def test_cancellation_from_on_token_is_not_wrapped(mock_api):
+    llm = make_llm(mock_api)
+
+    def on_token(token):
+        raise JobCancelled()
+
+    llm.on_token = on_token
+    with pytest.raises(JobCancelled):
+        llm.call("How many rows?")
+
+
+def test_abandoned_stream_is_closed(mock_api):
+    llm = make_llm(mock_api)
+    responses = []
+    post = llm._session.post
+
+    class RecordingSession:
+        def post(self, *args, **kwargs):
+            responses.append(post(*args, **kwargs))
+            return responses[-1]
+
+    def on_token(token):
+        raise JobCancelled()
+
+    llm._session = RecordingSession()
+    llm.on_token = on_token
+    with pytest.raises(JobCancelled):
+        llm.call("How many rows?")
+    assert responses and responses[0].raw.closed
@@ -0,0 +1,81 @@
+import io
+
+import pandas as pd
+import pytest
+
+from utils.ingest import read_csv_chunked, infer_schema, agent_frame
+
+
+def read(text, chunk_rows=3, **kwargs):
+    df, report = read_csv_chunked(io.BytesIO(text.encode()), chunk_rows=chunk_rows, **kwargs)
+    return df
+
+
+def assert_parquet_round_trip(df):
+    buf = io.BytesIO()
+    df.to_parquet(buf, engine="pyarrow", index=False)
+    buf.seek(0)
+    assert len(pd.read_parquet(buf)) == len(df)
+
+
+def test_late_text_in_numeric_column_is_read_as_text():
+    df = read("id,v\n1,a\n2,a\n3,b\nK5A,b\n5,a\n6,a\n")
+    assert df["id"].tolist() == ["1", "2", "3", "K5A", "5", "6"]
+    assert_parquet_round_trip(df)
+
+
+def test_category_column_empty_in_a_later_chunk():
+    df = read("c,x\nzeta,1\nzeta,2\nalpha,3\n,4\n,5\n,6\nbeta,7\nbeta,8\nbeta,9\n")
+    assert isinstance(df["c"].dtype, pd.CategoricalDtype)
+    assert df["c"].isna().sum() == 3
+    assert df["c"].dropna().tolist() == ["zeta", "zeta", "alpha", "beta", "beta", "beta"]
+    assert_parquet_round_trip(df)
+
+
+def test_categories_are_sorted_across_chunks():
+    df = read("c\nzeta\nzeta\nzeta\nalpha\nalpha\nalpha\n")
+    assert list(df["c"].cat.categories) == ["alpha", "zeta"]
+
+
+def test_integers_then_floats_upcast():
+    df = read("a\n1\n2\n3\n1.5\n2\n3\n")
+    assert pd.api.types.is_float_dtype(df["a"])
+    assert df["a"].tolist() == [1.0, 2.0, 3.0, 1.5, 2.0, 3.0]
+
+
+def test_flag_column_with_missing_values_keeps_booleans():
+    df = read("n,b\n1,True\n2,False\n3,True\n4,\n5,\n6,\n")
+    assert df["b"].tolist()[:3] == [True, False, True]
+    assert df["b"].isna().sum() == 3
+    assert_parquet_round_trip(df)
+
+
+@pytest.mark.parametrize("chunk_rows", [2, 3, 100])
+def test_matches_single_read_csv(chunk_rows):
+    text = "id,name,price,when\n" + "".join(
+        f"{i},{'xy'[i % 2]},{i * 1.25},2020-01-{i % 28 + 1:02d}\n" for i in range(20)
+    )
+    df = read(text, chunk_rows=chunk_rows)
+    expected = pd.read_csv(io.StringIO(text))
+    assert df["id"].tolist() == expected["id"].tolist()
+    assert df["name"].astype(object).tolist() == expected["name"].tolist()
+    assert df["price"].tolist() == expected["price"].tolist()
+    assert pd.api.types.is_datetime64_any_dtype(df["when"])
+
+
+def test_agent_frame_widens_compact_dtypes():
+    rows = "\n".join(f"{i % 100},{i % 124},{'abc'[i % 3]},{i % 2 == 0}" for i in range(1000))
+    stored = read("qty,price,kind,flag\n" + rows + "\n", chunk_rows=250)
+    assert stored["qty"].dtype == "int8" and isinstance(stored["kind"].dtype, pd.CategoricalDtype)
+    df = agent_frame(stored)
+    assert (df["qty"] * df["price"]).max() == (stored["qty"].astype(int) * stored["price"].astype(int)).max()
+    assert df["qty"].dtype == "int64" and df["kind"].dtype == object and df["flag"].dtype == bool
+    df.loc[0, "kind"] = "new value"
+    # The stored frame keeps its compact dtypes
+    assert stored["qty"].dtype == "int8" and isinstance(stored["kind"].dtype, pd.CategoricalDtype)
+
+
+def test_string_dtype_columns_are_planned():
+    df = pd.DataFrame({"d": pd.array(["2024-01-01", "2024-02-01"] * 5, dtype="string"),
+                       "c": pd.array(["a", "b"] * 5, dtype="string")})
+    assert infer_schema(df) == {"d": "datetime", "c": "category"}
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from utils.jobs import CANCELLED, DONE, TIMED_OUT, JobCancelled, JobLimitError, JobRunner
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def blocking(release):
+    def fn(job):
+        release.wait(5)
+        return "done"
+    return fn
+
+
+def test_result_and_limit():
+    runner = JobRunner(max_workers=2, per_user_limit=1)
+    release = threading.Event()
+    job = runner.submit("alice", blocking(release))
+    with pytest.raises(JobLimitError):
+        runner.submit("alice", blocking(release))
+    # Other users have their own slots
+    runner.submit("bob", blocking(release))
+    release.set()
+    wait_for(lambda: runner.get(job.id).finished)
+    assert job.status == DONE and job.result == "done"
+
+
+def test_timed_out_job_keeps_its_slot_until_the_thread_exits():
+    runner = JobRunner(max_workers=2, per_user_limit=1, timeout_seconds=0.05)
+    release = threading.Event()
+    job = runner.submit("alice", blocking(release))
+    wait_for(lambda: job.started_at is not None)
+    time.sleep(0.1)
+    assert runner.get(job.id).status == TIMED_OUT
+    runner.discard(job.id)
+    with pytest.raises(JobLimitError):
+        runner.submit("alice", blocking(release))
+    release.set()
+    wait_for(lambda: job.future.done())
+    runner.submit("alice", lambda job: None)
+
+
+def test_cancelled_job_keeps_its_slot_until_the_thread_exits():
+    runner = JobRunner(max_workers=1, per_user_limit=1)
+    release = threading.Event()
+
+    def fn(job):
+        release.wait(5)
+        job.check_cancelled()
+
+    job = runner.submit("alice", fn)
+    wait_for(lambda: job.started_at is not None)
+    runner.cancel(job.id)
+    assert job.status == CANCELLED
+    runner.discard(job.id)
+    with pytest.raises(JobLimitError):
+        runner.submit("alice", fn)
+    release.set()
+    wait_for(lambda: job.future.done())
+    assert job.status == CANCELLED
+
+
+def test_cancel_stops_at_the_next_token():
+    runner = JobRunner(max_workers=1)
+    started = threading.Event()
+
+    def fn(job):
+        started.set()
+        while True:
+            job.add_token("x")
+            time.sleep(0.01)
+
+    job = runner.submit("alice", fn)
+    started.wait(5)
+    runner.cancel(job.id)
+    wait_for(lambda: job.future.done())
+    with pytest.raises(JobCancelled):
+        job.check_cancelled()
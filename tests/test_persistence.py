@@ -0,0 +1,67 @@
+import itertools
+
+import pytest
+
+_users = itertools.count()
+
+
+@pytest.fixture
+def user(app_db):
+    """A fresh user with one stored file session"""
+    username = f"writer-{next(_users)}"
+    session = {"name": "a.csv", "dataset_ref": {"key": "k"}, "meta": {}, "chat_history": []}
+    app_db.write_session_updates(username, [app_db.file_session_update("f", session)])
+    return username
+
+
+def history(app_db, username):
+    doc = app_db.file_sessions_collection().find_one({"username": username, "file_id": "f"})
+    return None if doc is None else ([q for q, _ in doc["chat_history"]], doc["chat_count"])
+
+
+def test_replayed_chat_entry_is_written_once(app_db, user):
+    update = app_db.chat_entry_update("f", "q1", {"type": "text", "content": "a"})
+    app_db.write_session_updates(user, [update])
+    app_db.write_session_updates(user, [update])
+    assert history(app_db, user) == (["q1"], 1)
+
+
+def test_chat_entry_does_not_recreate_a_deleted_session(app_db, user):
+    update = app_db.chat_entry_update("f", "q1", {"type": "text", "content": "a"})
+    app_db.write_session_updates(user, [app_db.delete_file_update("f"), update])
+    assert history(app_db, user) is None
+
+
+def test_failed_batch_is_retried_before_later_updates(app_db, user, monkeypatch):
+    from utils import persistence
+    write = persistence.write_session_updates
+    calls = itertools.count()
+
+    def flaky(username, batch):
+        if next(calls) == 0:
+            # Part of the batch is stored before the connection drops
+            write(username, batch[:1])
+            raise ConnectionError("connection reset")
+        write(username, batch)
+
+    monkeypatch.setattr(persistence, "write_session_updates", flaky)
+    writer = persistence.SessionWriter(user)
+    writer.queue(app_db.chat_entry_update("f", "q1", {}))
+    writer.queue(app_db.chat_entry_update("f", "q2", {}))
+    writer.flush()
+    writer.queue(app_db.clear_chat_update("f"))
+    writer.queue(app_db.chat_entry_update("f", "q3", {}))
+    assert writer.wait() == []
+    assert history(app_db, user) == (["q3"], 1)
+
+
+def test_wait_reports_what_could_not_be_saved(app_db, user, monkeypatch):
+    from utils import persistence
+
+    def down(username, batch):
+        raise ConnectionError("no primary")
+
+    monkeypatch.setattr(persistence, "write_session_updates", down)
+    writer = persistence.SessionWriter(user)
+    writer.queue(app_db.chat_entry_update("f", "q1", {}))
+    assert len(writer.wait(timeout=5)) == 1
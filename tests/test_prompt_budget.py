@@ -0,0 +1,62 @@
+import pandas as pd
+
+from llms.prompt_budget import PromptBudget, estimate_tokens, schema_summary
+
+PROMPT = """<dataframe dfs[0]>
+order_id,region,amount
+1,North,10.5
+2,South,20.0
+</dataframe>
+<conversation>
+{conversation}
+</conversation>
+Question: total amount by region?"""
+
+
+def frame():
+    return pd.DataFrame({
+        "order_id": range(100),
+        "region": ["North", "South", "East", "West"] * 25,
+        "amount": [float(i) for i in range(100)],
+    })
+
+
+def test_schema_summary_describes_every_column():
+    summary = schema_summary("summary-test", frame())
+    assert summary.splitlines()[0] == "100 rows x 3 columns"
+    assert "- amount: float64, 100 unique, range 0.0 to 99.0" in summary
+    assert "- region:" in summary and "'North'" in summary
+
+
+def test_schema_summary_is_cached_per_key():
+    first = schema_summary("cached-test", frame())
+    assert schema_summary("cached-test", frame().head(1)) == first
+
+
+def test_compact_swaps_rows_for_the_summary_and_trims_the_conversation():
+    budget = PromptBudget(max_conversation_tokens=20).register([("compact-test", frame())])
+    conversation = "\n".join(f"User: question number {i} about the data" for i in range(50))
+    text, tokens = budget.compact(PROMPT.format(conversation=conversation))
+    assert "dfs[0]: 100 rows x 3 columns" in text
+    assert "1,North,10.5" not in text
+    assert "question number 49" in text and "question number 0 " not in text
+    assert text.endswith("Question: total amount by region?")
+    assert tokens == estimate_tokens(text)
+
+
+def test_compact_keeps_the_question_when_over_budget():
+    budget = PromptBudget(max_prompt_tokens=50)
+    text, tokens = budget.compact("instructions " * 500 + "Question: how many rows?")
+    assert tokens <= 55
+    assert text.startswith("instructions")
+    assert text.endswith("Question: how many rows?")
+
+
+def test_stats_report_tokens_saved():
+    budget = PromptBudget()
+    assert budget.stats() == {"calls": 0}
+    budget.record(1000, 300, 50, 0.5)
+    budget.record(800, 200, 30, 0.3)
+    stats = budget.stats()
+    assert (stats["calls"], stats["prompt_tokens"], stats["completion_tokens"]) == (2, 500, 80)
+    assert stats["prompt_tokens_saved"] == 1300
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from llms.rate_limiter import RateLimiter, parse_reset_duration
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66), ("2m59.56s", 179.56), ("250ms", 0.25), ("1h", 3600), ("12", 12.0), (None, None), ("soon", None),
+])
+def test_parse_reset_duration(value, seconds):
+    if seconds is None:
+        assert parse_reset_duration(value) is None
+    else:
+        assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+def tokens_left(limiter):
+    with limiter._state.transaction() as state:
+        return state["tokens"]
+
+
+def test_acquire_takes_tokens_and_times_out_when_empty():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100)
+    assert limiter.acquire(80)
+    assert tokens_left(limiter) == pytest.approx(20, abs=1)
+    assert not limiter.acquire(80, timeout=0.05)
+
+
+def test_oversized_request_is_capped_at_the_bucket():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=100)
+    assert limiter.acquire(1000, timeout=0.1)
+
+
+def test_settle_returns_unused_tokens():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    limiter.acquire(600)
+    limiter.settle(600, 150)
+    assert tokens_left(limiter) == pytest.approx(850, abs=1)
+    # A reservation can't be credited twice over the bucket size, nor go negative
+    limiter.settle(600, 0)
+    assert tokens_left(limiter) == pytest.approx(1000)
+    limiter.settle(600, 700)
+    assert tokens_left(limiter) == pytest.approx(1000)
+
+
+def test_settle_wakes_a_waiting_caller():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    limiter.acquire(600)
+    limiter.settle(600, 100)
+    start = time.time()
+    assert limiter.acquire(400, timeout=1)
+    assert time.time() - start < 0.5
+
+
+def test_headers_lower_the_bucket_and_pause_when_exhausted():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=1000)
+    limiter.update_from_headers({"x-ratelimit-remaining-tokens": "300"})
+    assert tokens_left(limiter) == pytest.approx(300, abs=1)
+    limiter.update_from_headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "5s"})
+    assert not limiter.acquire(1, timeout=0.05)
+
+
+def test_file_state_is_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "limits.json")
+    first = RateLimiter(requests_per_minute=60, tokens_per_minute=100, state_path=path)
+    second = RateLimiter(requests_per_minute=60, tokens_per_minute=100, state_path=path)
+    assert first.acquire(90)
+    assert not second.acquire(90, timeout=0.05)
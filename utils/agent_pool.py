@@ -0,0 +1,123 @@
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_MAX_AGENTS = 16
+DEFAULT_IDLE_SECONDS = 30 * 60
+MEMORY_SIZE = 10
+
+
+def add_exchange(memory, question, answer):
+    """Record a question/answer pair (e.g. one served from the answer cache) in a conversation memory"""
+    memory.add(question, True)
+    memory.add(answer.get("content", "[chart]") if isinstance(answer, dict) else str(answer), False)
+
+
+def new_memory(chat_history=()):
+    """
+    Per-user conversation memory for a pooled agent, seeded from the stored chat
+    history so context survives logout/login.
+    """
+    from pandasai.helpers.memory import Memory
+    memory = Memory(MEMORY_SIZE)
+    for question, answer in list(chat_history)[-MEMORY_SIZE:]:
+        add_exchange(memory, question, answer)
+    return memory
+
+
+@contextmanager
+def private_frames(agent):
+    """
+    Give the agent's generated code shallow copies of its frames for one call. The frames
+    are shared with every user of the pooled agent and with the dataset cache; under
+    copy-on-write nothing the code assigns or drops in place reaches them.
+    """
+    connectors = agent.context.dfs
+    shared = [connector.pandas_df for connector in connectors]
+    for connector, df in zip(connectors, shared):
+        connector.pandas_df = df.copy(deep=False)
+    try:
+        yield
+    finally:
+        for connector, df in zip(connectors, shared):
+            connector.pandas_df = df
+
+
+class _PooledAgent:
+    def __init__(self, agent, llm):
+        self.agent = agent
+        self.llm = llm
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        self.leases = 0
+
+
+class AgentPool:
+    """
+    Process-wide pool of pandasai Agents keyed by dataset fingerprint. Users asking
+    about the same data share one warm Agent (and its dataframe wrapper and LLM
+    client); each user's conversation memory, and a private view of the frames, is
+    swapped in for the duration of a call.
+    """
+
+    def __init__(self, factory, max_agents=DEFAULT_MAX_AGENTS, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.factory = factory
+        self.max_agents = max_agents
+        self.idle_seconds = idle_seconds
+        self._agents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._agents)
+
+    def _evict(self):
+        now = time.time()
+        for key, pooled in list(self._agents.items()):
+            if pooled.leases == 0 and now - pooled.last_used > self.idle_seconds:
+                del self._agents[key]
+        # Least recently used first; agents that are in use are never evicted
+        for key, pooled in list(self._agents.items()):
+            if len(self._agents) <= self.max_agents:
+                break
+            if pooled.leases == 0:
+                del self._agents[key]
+
+    def _checkout(self, key, load_frames):
+        with self._lock:
+            pooled = self._agents.get(key)
+            if pooled is not None:
+                self._agents.move_to_end(key)
+                pooled.leases += 1
+                return pooled
+        # Build outside the pool lock so other datasets are not blocked meanwhile
+        agent, llm = self.factory(key, load_frames())
+        with self._lock:
+            pooled = self._agents.setdefault(key, _PooledAgent(agent, llm))
+            self._agents.move_to_end(key)
+            pooled.leases += 1
+            self._evict()
+            return pooled
+
+    @contextmanager
+    def lease(self, key, load_frames, memory):
+        """
+        Yield (agent, llm) for the dataset `key` with `memory` as its conversation.
+        load_frames is only called when the agent has to be built.
+        """
+        pooled = self._checkout(key, load_frames)
+        try:
+            with pooled.lock:
+                context = pooled.agent.context
+                previous = context.memory
+                context.memory = memory
+                try:
+                    with private_frames(pooled.agent):
+                        yield pooled.agent, pooled.llm
+                finally:
+                    context.memory = previous
+                    pooled.llm.on_token = None
+        finally:
+            with self._lock:
+                pooled.leases -= 1
+                pooled.last_used = time.time()
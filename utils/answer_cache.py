@@ -0,0 +1,127 @@
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pymongo.errors import OperationFailure
+from utils.telemetry import span, telemetry
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+CONTEXT_TURNS = 3
+
+# pandasai's fallback text when generated code fails; never worth replaying
+UNCACHEABLE_MARKERS = ("Unfortunately, I was not able to",)
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+class AnswerCache:
+    """
+    Two-level cache of processed agent answers: an in-process LRU in front of a
+    MongoDB collection whose TTL index expires old entries.
+    """
+
+    def __init__(self, collection=None, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "memory_hits": 0, "misses": 0, "stores": 0}
+        if self.collection is not None:
+            self._ensure_ttl_index()
+
+    def _ensure_ttl_index(self):
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        except OperationFailure:
+            # ANSWER_CACHE_TTL_SECONDS changed since the index was built, and create_index
+            # cannot change an existing index's options; rebuild it with the new TTL
+            existing = self.collection.index_information().get("created_at_1", {})
+            if existing.get("expireAfterSeconds") in (None, self.ttl_seconds):
+                raise
+            self.collection.drop_index("created_at_1")
+            self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    def make_key(self, fingerprint, question, context=()):
+        """Key an answer by dataset content, normalized question and the preceding questions"""
+        payload = json.dumps([
+            fingerprint,
+            normalize_question(question),
+            [normalize_question(q) for q in list(context)[-CONTEXT_TURNS:]],
+        ])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self.metrics[name] += 1
+        for name in names:
+            # Also exported as allytics_answer_cache_<name>_total
+            telemetry.count(f"answer_cache_{name}")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                else:
+                    del self._entries[key]
+                    entry = None
+        if entry is not None:
+            self._count("hits", "memory_hits")
+            return entry[1]
+
+        if self.collection is not None:
+            with span("cache.lookup"):
+                doc = self.collection.find_one({"_id": key}, projection={"answer": 1, "created_at": 1})
+            if doc is not None:
+                created_at = doc["created_at"].replace(tzinfo=timezone.utc).timestamp()
+                # The TTL monitor only runs periodically, so check the age here too
+                if now - created_at < self.ttl_seconds:
+                    self._remember(key, doc["answer"], created_at)
+                    self._count("hits")
+                    return doc["answer"]
+
+        self._count("misses")
+        return None
+
+    def _remember(self, key, answer, stored_at):
+        with self._lock:
+            self._entries[key] = (stored_at, answer)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, key, answer):
+        if answer.get("type") == "text" and any(m in answer.get("content", "") for m in UNCACHEABLE_MARKERS):
+            return
+        self._remember(key, answer, time.time())
+        self._count("stores")
+        if self.collection is not None:
+            try:
+                with span("cache.write"):
+                    self.collection.replace_one(
+                        {"_id": key},
+                        {"answer": answer, "created_at": datetime.now(timezone.utc)},
+                        upsert=True
+                    )
+            except Exception as e:
+                # e.g. a chart too large for one document; the in-process entry still serves it
+                print(f"Answer cache write skipped: {e}")
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics["entries"] = len(self._entries)
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = metrics["hits"] / lookups if lookups else 0.0
+        return metrics
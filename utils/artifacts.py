@@ -0,0 +1,91 @@
+import io
+import time
+import hashlib
+import threading
+
+THUMBNAIL_SIZE = (320, 240)
+EVICT_EVERY_SAVES = 50
+
+
+class ArtifactStore:
+    """
+    Content-addressed storage for chart artifacts, so chat history only keeps small
+    references. Images get a thumbnail; plotly figures are kept as their JSON spec.
+    """
+
+    def __init__(self, backend, max_bytes=None, max_age_seconds=None):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._saves = 0
+        self._lock = threading.Lock()
+
+    def _put(self, data):
+        key = hashlib.sha256(data).hexdigest()
+        # Identical charts (e.g. the same question asked twice) are stored once; a chart saved
+        # again gets a fresh timestamp so age-based eviction doesn't drop one still in use
+        if not self.backend.touch(key):
+            self.backend.put(key, data)
+        return key
+
+    def _thumbnail(self, png_bytes):
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        try:
+            image = Image.open(io.BytesIO(png_bytes))
+            image.thumbnail(THUMBNAIL_SIZE)
+            buf = io.BytesIO()
+            image.save(buf, format="PNG", optimize=True)
+            return self._put(buf.getvalue())
+        except Exception:
+            return None
+
+    def save_image(self, png_bytes):
+        ref = {
+            "type": "image_ref",
+            "key": self._put(png_bytes),
+            "thumb": self._thumbnail(png_bytes),
+            "nbytes": len(png_bytes),
+        }
+        self._after_save()
+        return ref
+
+    def save_plotly(self, fig):
+        data = fig.to_json().encode()
+        ref = {"type": "plotly_ref", "key": self._put(data), "nbytes": len(data)}
+        self._after_save()
+        return ref
+
+    def load(self, key):
+        """Raw artifact bytes, or None once the artifact has been evicted"""
+        try:
+            return self.backend.get(key)
+        except Exception:
+            return None
+
+    def _after_save(self):
+        with self._lock:
+            self._saves += 1
+            due = self._saves % EVICT_EVERY_SAVES == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Delete artifacts older than the age limit, then the oldest ones until under the size limit"""
+        if self.max_bytes is None and self.max_age_seconds is None:
+            return 0
+        items = sorted(self.backend.items(), key=lambda item: item[2])
+        now = time.time()
+        total = sum(size for _, size, _ in items)
+        removed = 0
+        for key, size, created in items:
+            too_old = self.max_age_seconds is not None and now - created > self.max_age_seconds
+            too_big = self.max_bytes is not None and total > self.max_bytes
+            if not (too_old or too_big):
+                break
+            self.backend.delete(key)
+            total -= size
+            removed += 1
+        return removed
@@ -1,7 +1,63 @@
+import hmac
+import json
+import time
+import base64
+import hashlib
+import secrets
 from werkzeug.security import generate_password_hash, check_password_hash
 
-def hash_password(password):
-    return generate_password_hash(password)
+DEFAULT_HASH_METHOD = "scrypt:32768:8:1"
+DEFAULT_TOKEN_TTL_SECONDS = 30 * 60
+_HASH_PREFIXES = ("scrypt", "pbkdf2")
+
+def hash_password(password, method=DEFAULT_HASH_METHOD):
+    return generate_password_hash(password, method=method)
 
 def verify_password(password, hashed):
     return check_password_hash(hashed, password)
+
+def is_password_hash(value):
+    """True for werkzeug hashes ("method$salt$hash"), False for passwords stored before hashing"""
+    parts = value.split("$")
+    return len(parts) == 3 and parts[0].split(":")[0] in _HASH_PREFIXES
+
+def needs_rehash(hashed, method=DEFAULT_HASH_METHOD):
+    """True when a hash was made with a different KDF or cost than the configured one"""
+    stored = hashed.split("$", 1)[0].split(":")
+    wanted = method.split(":")
+    # "scrypt" alone accepts any scrypt cost; "pbkdf2:sha256:600000" pins it
+    return stored[:len(wanted)] != wanted
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload, secret):
+    return _b64(hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest())
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+def issue_session_token(username, name, secret, ttl_seconds=DEFAULT_TOKEN_TTL_SECONDS, session_id=None):
+    """
+    Signed, short-lived proof of a verified login; checking it needs no KDF or database.
+    session_id ties the token to a server-side login session that logout can revoke.
+    """
+    claims = {"u": username, "n": name, "exp": int(time.time()) + ttl_seconds}
+    if session_id is not None:
+        claims["sid"] = session_id
+    payload = _b64(json.dumps(claims).encode())
+    return f"{payload}.{_sign(payload, secret)}"
+
+def verify_session_token(token, secret):
+    """The token's claims ({"u", "n", "exp", "sid"}) if it is authentic and unexpired, else None"""
+    payload, _, signature = (token or "").partition(".")
+    if not payload or not hmac.compare_digest(signature, _sign(payload, secret)):
+        return None
+    try:
+        claims = json.loads(_unb64(payload))
+    except ValueError:
+        return None
+    return claims if claims.get("exp", 0) > time.time() else None
@@ -0,0 +1,298 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from utils.sql_engine import quote_identifier
+
+MAX_POINTS = 5000         # Line/scatter points sent to the browser
+HEATMAP_BINS = 200        # Per axis, for dense scatter plots
+HISTOGRAM_BINS = 50
+MAX_CATEGORIES = 50       # Bars / boxes / line points shown for categorical x
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the points that best preserve
+    the visual shape of a line. x must be sorted and numeric.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # Average of the next bucket is the third triangle vertex
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        bx, by = x[start:end], y[start:end]
+        areas = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def _as_number(series):
+    """Numeric view of a numeric or datetime column for the reduction math"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    return series.to_numpy(dtype=np.float64)
+
+
+def _is_continuous(series):
+    return (pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)) \
+        or pd.api.types.is_datetime64_any_dtype(series)
+
+
+def _pair(df, x, y):
+    """Rows where both x and y are set; x and y may be the same column"""
+    return df[[x] if x == y else [x, y]].dropna()
+
+
+def _group_points(data, x, y, agg):
+    # Series, not reset_index(): the group key and the value may be the same column
+    grouped = data.groupby(x, observed=True, sort=True)[y].agg(agg)
+    return grouped.index, grouped.to_numpy()
+
+
+def _top_categories(data, x):
+    counts = data[x].value_counts()
+    if len(counts) <= MAX_CATEGORIES:
+        return data, None
+    keep = counts.index[:MAX_CATEGORIES]
+    return data[data[x].isin(keep)], f"Showing the {MAX_CATEGORIES} most frequent of {len(counts):,} {x} values."
+
+
+def line_chart(df, x, y):
+    data = _pair(df, x, y)
+    if not _is_continuous(data[x]):
+        # Categorical x: one point per category, for the most frequent categories only
+        data, note = _top_categories(data, x)
+        xs, ys = _group_points(data, x, y, "mean")
+        return go.Figure(go.Scatter(x=xs, y=ys, mode="lines")), note
+    data = data.sort_values(x)
+    note = None
+    if len(data) > MAX_POINTS:
+        idx = lttb(_as_number(data[x]), data[y].to_numpy(dtype=np.float64), MAX_POINTS)
+        note = f"Downsampled {len(data):,} points to {len(idx):,} (LTTB)."
+        data = data.iloc[idx]
+    return go.Figure(go.Scatter(x=data[x], y=data[y], mode="lines")), note
+
+
+def scatter_chart(df, x, y):
+    data = _pair(df, x, y)
+    if len(data) <= MAX_POINTS:
+        return go.Figure(go.Scatter(x=data[x], y=data[y], mode="markers")), None
+    if not _is_continuous(data[x]):
+        data = data.sample(MAX_POINTS, random_state=0)
+        return go.Figure(go.Scatter(x=data[x], y=data[y], mode="markers")), \
+            f"Showing a random sample of {MAX_POINTS:,} points."
+    # Dense numeric scatter: bin into a 2D count grid instead of shipping every point
+    xs, ys = _as_number(data[x]), data[y].to_numpy(dtype=np.float64)
+    counts, x_edges, y_edges = np.histogram2d(xs, ys, bins=HEATMAP_BINS)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(data[x]):
+        x_centers = pd.to_datetime(x_centers.astype(np.int64))
+    return _heatmap(x_centers, (y_edges[:-1] + y_edges[1:]) / 2, counts, len(data))
+
+
+def _heatmap(x_centers, y_centers, counts, total):
+    z = np.where(counts.T > 0, counts.T, np.nan)
+    fig = go.Figure(go.Heatmap(x=x_centers, y=y_centers, z=z, colorscale="Viridis", colorbar={"title": "count"}))
+    return fig, f"{total:,} points binned into a {HEATMAP_BINS}×{HEATMAP_BINS} density grid."
+
+
+def bar_chart(df, x, y):
+    data, note = _top_categories(_pair(df, x, y), x)
+    # Stacked bars of raw rows add up to the group total, so pre-aggregate with sum
+    xs, ys = _group_points(data, x, y, "sum")
+    return go.Figure(go.Bar(x=xs, y=ys)), note
+
+
+def histogram_chart(df, x):
+    values = df[x].dropna()
+    numbers = _as_number(values)
+    counts, edges = np.histogram(numbers, bins=HISTOGRAM_BINS)
+    centers = (edges[:-1] + edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(values):
+        centers = pd.to_datetime(centers.astype(np.int64))
+    fig = go.Figure(go.Bar(x=centers, y=counts))
+    fig.update_layout(bargap=0)
+    return fig, None
+
+
+def box_chart(df, x, y):
+    data, note = _top_categories(_pair(df, x, y), x)
+    # Precompute the five-number summary per group instead of sending every value
+    grouped = data.groupby(x, observed=True, sort=True)[y]
+    q = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    low, high = grouped.min(), grouped.max()
+    return _box(list(q.index), q[0.25], q[0.5], q[0.75], low, high), note
+
+
+def _box(groups, q1, median, q3, low, high):
+    iqr = q3 - q1
+    lower = np.maximum(low, q1 - 1.5 * iqr)
+    upper = np.minimum(high, q3 + 1.5 * iqr)
+    return go.Figure(go.Box(
+        x=groups, q1=q1.tolist(), median=median.tolist(), q3=q3.tolist(),
+        lowerfence=lower.tolist(), upperfence=upper.tolist(), boxpoints=False,
+    ))
+
+
+def _sql_number(column, kind):
+    return f"epoch_us({column})::DOUBLE" if kind == "datetime" else f"{column}::DOUBLE"
+
+
+def _from_sql_number(values, kind):
+    return pd.to_datetime(values, unit="us") if kind == "datetime" else values
+
+
+def _bin_index(expr, low, width, bins):
+    return f"least(CAST(floor(({expr} - {low!r}) / {width!r}) AS BIGINT), {bins - 1})"
+
+
+def _sql_range(engine, source, expr, where):
+    low, high = engine.query(f"SELECT min({expr}) AS lo, max({expr}) AS hi FROM {source} WHERE {where}").iloc[0]
+    if pd.isna(low):
+        return 0.0, 1.0
+    # A constant column still gets one non-empty bin
+    return float(low), float(high - low) or 1.0
+
+
+def _sql_top_groups(engine, source, x, aggregates, where):
+    """Per-group aggregates for the MAX_CATEGORIES most frequent x values, sorted by x"""
+    data = engine.query(
+        f"SELECT {quote_identifier(x)} AS x, {aggregates}, count(*) AS n, count(*) OVER () AS groups "
+        f"FROM {source} WHERE {where} GROUP BY 1 ORDER BY n DESC LIMIT {MAX_CATEGORIES}"
+    )
+    groups = int(data["groups"].iloc[0]) if len(data) else 0
+    note = f"Showing the {MAX_CATEGORIES} most frequent of {groups:,} {x} values." if groups > MAX_CATEGORIES else None
+    return data.sort_values("x").reset_index(drop=True), note
+
+
+def sql_line_chart(engine, source, x, y, kinds):
+    qx, qy = quote_identifier(x), quote_identifier(y)
+    where = f"{qx} IS NOT NULL AND {qy} IS NOT NULL"
+    if kinds.get(x) not in ("numeric", "datetime"):
+        data, note = _sql_top_groups(engine, source, x, f"avg({qy}) AS y", where)
+        return go.Figure(go.Scatter(x=data["x"], y=data["y"], mode="lines")), note
+    total = engine.scalar(f"SELECT count(*) FROM {source} WHERE {where}")
+    if total <= MAX_POINTS:
+        data = engine.query(f"SELECT {qx} AS x, {qy} AS y FROM {source} WHERE {where} ORDER BY 1")
+        return go.Figure(go.Scatter(x=data["x"], y=data["y"], mode="lines")), None
+    # Min/max per x bucket (M4-style) keeps the peaks LTTB would keep, without sorting every row
+    buckets = MAX_POINTS // 2
+    xn = _sql_number(qx, kinds[x])
+    low, width = _sql_range(engine, source, xn, where)
+    data = engine.query(
+        f"SELECT arg_min({qx}, {qy}) AS x_lo, min({qy}) AS y_lo, arg_max({qx}, {qy}) AS x_hi, max({qy}) AS y_hi "
+        f"FROM {source} WHERE {where} GROUP BY {_bin_index(xn, low, width / buckets, buckets)}"
+    )
+    points = pd.concat([
+        data[["x_lo", "y_lo"]].set_axis(["x", "y"], axis=1),
+        data[["x_hi", "y_hi"]].set_axis(["x", "y"], axis=1),
+    ]).drop_duplicates().sort_values("x")
+    note = f"Downsampled {total:,} points to {len(points):,} (min/max per bucket)."
+    return go.Figure(go.Scatter(x=points["x"], y=points["y"], mode="lines")), note
+
+
+def sql_scatter_chart(engine, source, x, y, kinds):
+    qx, qy = quote_identifier(x), quote_identifier(y)
+    where = f"{qx} IS NOT NULL AND {qy} IS NOT NULL"
+    select = f"SELECT {qx} AS x, {qy} AS y FROM {source} WHERE {where}"
+    total = engine.scalar(f"SELECT count(*) FROM {source} WHERE {where}")
+    if total <= MAX_POINTS:
+        data = engine.query(select)
+        return go.Figure(go.Scatter(x=data["x"], y=data["y"], mode="markers")), None
+    if kinds.get(x) not in ("numeric", "datetime"):
+        data = engine.query(f"SELECT * FROM ({select}) USING SAMPLE reservoir({MAX_POINTS} ROWS) REPEATABLE (0)")
+        return go.Figure(go.Scatter(x=data["x"], y=data["y"], mode="markers")), \
+            f"Showing a random sample of {MAX_POINTS:,} points."
+    xn, yn = _sql_number(qx, kinds[x]), _sql_number(qy, "numeric")
+    x_low, x_width = _sql_range(engine, source, xn, where)
+    y_low, y_width = _sql_range(engine, source, yn, where)
+    cells = engine.query(
+        f"SELECT {_bin_index(xn, x_low, x_width / HEATMAP_BINS, HEATMAP_BINS)} AS i, "
+        f"{_bin_index(yn, y_low, y_width / HEATMAP_BINS, HEATMAP_BINS)} AS j, count(*) AS n "
+        f"FROM {source} WHERE {where} GROUP BY 1, 2"
+    )
+    counts = np.zeros((HEATMAP_BINS, HEATMAP_BINS))
+    counts[cells["i"].to_numpy(), cells["j"].to_numpy()] = cells["n"].to_numpy()
+    centers = np.arange(HEATMAP_BINS) + 0.5
+    x_centers = _from_sql_number(x_low + centers * x_width / HEATMAP_BINS, kinds[x])
+    return _heatmap(x_centers, y_low + centers * y_width / HEATMAP_BINS, counts, total)
+
+
+def sql_bar_chart(engine, source, x, y, kinds):
+    qx, qy = quote_identifier(x), quote_identifier(y)
+    data, note = _sql_top_groups(engine, source, x, f"sum({qy}) AS y", f"{qx} IS NOT NULL AND {qy} IS NOT NULL")
+    return go.Figure(go.Bar(x=data["x"], y=data["y"])), note
+
+
+def sql_histogram_chart(engine, source, x, kinds):
+    qx = quote_identifier(x)
+    where = f"{qx} IS NOT NULL"
+    xn = _sql_number(qx, kinds.get(x))
+    low, width = _sql_range(engine, source, xn, where)
+    bins = engine.query(
+        f"SELECT {_bin_index(xn, low, width / HISTOGRAM_BINS, HISTOGRAM_BINS)} AS i, count(*) AS n "
+        f"FROM {source} WHERE {where} GROUP BY 1"
+    )
+    counts = np.zeros(HISTOGRAM_BINS)
+    counts[bins["i"].to_numpy()] = bins["n"].to_numpy()
+    centers = _from_sql_number(low + (np.arange(HISTOGRAM_BINS) + 0.5) * width / HISTOGRAM_BINS, kinds.get(x))
+    fig = go.Figure(go.Bar(x=centers, y=counts))
+    fig.update_layout(bargap=0)
+    return fig, None
+
+
+def sql_box_chart(engine, source, x, y, kinds):
+    qx, qy = quote_identifier(x), quote_identifier(y)
+    data, note = _sql_top_groups(
+        engine, source, x,
+        f"quantile_cont({qy}, 0.25) AS q1, median({qy}) AS q2, quantile_cont({qy}, 0.75) AS q3, "
+        f"min({qy}) AS lo, max({qy}) AS hi",
+        f"{qx} IS NOT NULL AND {qy} IS NOT NULL",
+    )
+    return _box(data["x"].tolist(), data["q1"], data["q2"], data["q3"], data["lo"], data["hi"]), note
+
+
+def reduced_chart_sql(engine, key, graph_type, x, y, kinds):
+    """reduced_chart computed by the SQL engine over the stored file; kinds maps column -> profile kind"""
+    source = engine.table(key)
+    if graph_type == "Line":
+        fig, note = sql_line_chart(engine, source, x, y, kinds)
+    elif graph_type == "Bar":
+        fig, note = sql_bar_chart(engine, source, x, y, kinds)
+    elif graph_type == "Histogram":
+        fig, note = sql_histogram_chart(engine, source, x, kinds)
+    elif graph_type == "Boxplot":
+        fig, note = sql_box_chart(engine, source, x, y, kinds)
+    elif graph_type == "Scatter":
+        fig, note = sql_scatter_chart(engine, source, x, y, kinds)
+    else:
+        raise ValueError(f"Unknown graph type: {graph_type}")
+    fig.update_layout(xaxis_title=x, yaxis_title=y or "count")
+    return fig, note
+
+
+def reduced_chart(df, graph_type, x, y=None):
+    """Build a chart whose payload stays bounded regardless of row count; returns (figure, note)"""
+    if graph_type == "Line":
+        fig, note = line_chart(df, x, y)
+    elif graph_type == "Bar":
+        fig, note = bar_chart(df, x, y)
+    elif graph_type == "Histogram":
+        fig, note = histogram_chart(df, x)
+    elif graph_type == "Boxplot":
+        fig, note = box_chart(df, x, y)
+    elif graph_type == "Scatter":
+        fig, note = scatter_chart(df, x, y)
+    else:
+        raise ValueError(f"Unknown graph type: {graph_type}")
+    fig.update_layout(xaxis_title=x, yaxis_title=y or "count")
+    return fig, note
@@ -0,0 +1,204 @@
+import io
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+import pandas as pd
+from utils.telemetry import span
+
+PARQUET_COMPRESSION = "zstd"
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class FrameCache:
+    """Process-wide LRU cache of loaded DataFrames bounded by a memory budget"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key):
+        with self._lock:
+            df = self._frames.get(key)
+            if df is not None:
+                self._frames.move_to_end(key)
+            return df
+
+    def put(self, key, df):
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._frames[key] = df
+            self._frames.move_to_end(key)
+            self._sizes[key] = size
+            # Evict least recently used frames, but always keep the newest one
+            while self.total_bytes > self.max_bytes and len(self._frames) > 1:
+                old_key, _ = self._frames.popitem(last=False)
+                self._sizes.pop(old_key, None)
+
+    def discard(self, key):
+        with self._lock:
+            self._frames.pop(key, None)
+            self._sizes.pop(key, None)
+
+
+class LocalBlobBackend:
+    """Stores blobs as files under a directory on local disk"""
+
+    name = "local"
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def put(self, key, data):
+        path = self.path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        # Atomic rename so readers never see a half-written file
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def touch(self, key):
+        """Refresh a blob's timestamp; False if there is no such blob"""
+        try:
+            os.utime(self.path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def items(self):
+        """(key, size in bytes, created timestamp) for every stored blob"""
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                yield entry.name, stat.st_size, stat.st_mtime
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+class GridFSBlobBackend:
+    """Stores blobs as chunked GridFS files in MongoDB"""
+
+    name = "gridfs"
+
+    def __init__(self, database, bucket="datasets", chunk_size=1024 * 1024):
+        from gridfs import GridFSBucket
+        self.bucket = GridFSBucket(database, bucket_name=bucket, chunk_size_bytes=chunk_size)
+        self._files = database[f"{bucket}.files"]
+
+    def put(self, key, data):
+        self.delete(key)
+        self.bucket.upload_from_stream_with_id(key, key, io.BytesIO(data))
+
+    def get(self, key):
+        return self.bucket.open_download_stream(key).read()
+
+    def exists(self, key):
+        return next(iter(self.bucket.find({"_id": key}).limit(1)), None) is not None
+
+    def touch(self, key):
+        """Refresh a blob's timestamp; False if there is no such blob"""
+        result = self._files.update_one({"_id": key}, {"$set": {"uploadDate": datetime.now(timezone.utc)}})
+        return result.matched_count > 0
+
+    def items(self):
+        """(key, size in bytes, created timestamp) for every stored blob"""
+        for f in self.bucket.find():
+            yield f._id, f.length, f.upload_date.replace(tzinfo=timezone.utc).timestamp()
+
+    def delete(self, key):
+        from gridfs.errors import NoFile
+        try:
+            self.bucket.delete(key)
+        except NoFile:
+            pass
+
+
+class DatasetStore:
+    """Persists DataFrames as compressed Parquet blobs and hands out references"""
+
+    def __init__(self, backend, compression=PARQUET_COMPRESSION, cache=None):
+        self.backend = backend
+        self.compression = compression
+        self.cache = cache or FrameCache()
+
+    def save(self, df, key=None):
+        key = key or uuid.uuid4().hex
+        with span("store.save", backend=self.backend.name, rows=len(df)) as save_span:
+            buf = io.BytesIO()
+            # Parquet keeps the pandas schema, so dtypes survive the round trip
+            df.to_parquet(buf, engine="pyarrow", compression=self.compression, index=False)
+            data = buf.getvalue()
+            self.backend.put(key, data)
+            save_span.set(bytes=len(data))
+        self.cache.put(key, df)
+        return {
+            "backend": self.backend.name,
+            "key": key,
+            "format": "parquet",
+            "nbytes": len(data),
+        }
+
+    def load(self, ref):
+        """Return the DataFrame for a reference, reading it from the backend on a cache miss"""
+        df = self.cache.get(ref["key"])
+        if df is None:
+            with span("store.load", backend=self.backend.name) as load_span:
+                data = self.backend.get(ref["key"])
+                df = pd.read_parquet(io.BytesIO(data), engine="pyarrow")
+                load_span.set(bytes=len(data), rows=len(df))
+            self.cache.put(ref["key"], df)
+        return df
+
+    def delete(self, ref):
+        self.cache.discard(ref["key"])
+        self.backend.delete(ref["key"])
+
+
+def describe_frame(df):
+    """Lightweight metadata kept with a file session so the frame itself can stay unloaded"""
+    return {
+        "rows": int(df.shape[0]),
+        "columns": int(df.shape[1]),
+        "schema": {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+    }
+
+
+def make_blob_backend(database, kind="gridfs", root=None, bucket="datasets"):
+    """
+    Build the blob backend configured for this deployment (one directory/bucket per kind
+    of data). For local storage, root is the directory the blobs go in.
+    """
+    if kind == "local":
+        return LocalBlobBackend(root or os.path.join(os.getcwd(), ".allytics_data", bucket))
+    if kind == "gridfs":
+        return GridFSBlobBackend(database, bucket=bucket)
+    raise ValueError(f"Unknown dataset store: {kind}")
+
+
+def make_dataset_store(database, kind="gridfs", root=None, cache_bytes=DEFAULT_CACHE_BYTES):
+    """Build the dataset store configured for this deployment"""
+    # Local datasets live directly in root (DATASET_DIR), where they have always been
+    backend = make_blob_backend(database, kind, root, bucket="datasets")
+    return DatasetStore(backend, cache=FrameCache(cache_bytes))
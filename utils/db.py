@@ -1,31 +1,224 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, DeleteOne, ReturnDocument, ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
-import pandas as pd
-import numpy as np
-from io import StringIO
+import hmac
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 import streamlit as st
+from utils.artifacts import ArtifactStore
+from utils.answer_cache import AnswerCache
+from utils.telemetry import traced
+from utils.auth import hash_password, verify_password, is_password_hash, needs_rehash, new_session_id, DEFAULT_HASH_METHOD
 
-MONGO_URI = st.secrets["MONGO_URI"]
-client = MongoClient(MONGO_URI)
-db = client["allytics"]
-users_collection = db["users"]
+# Nothing here connects or imports pandas/pyarrow at import time: the login page only needs
+# the users collection, and the dataset stores are built the first time a dataset is touched
 
+PASSWORD_HASH_METHOD = st.secrets.get("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD)
+
+# No spinner on the getters the session check reaches before the page calls set_page_config
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """One MongoClient (and connection pool) per process, shared by every session"""
+    mongo_uri = st.secrets["MONGO_URI"]
+    if mongo_uri.startswith("mongomock://"):
+        # In-memory stand-in for local benchmarks and experiments (pip install mongomock)
+        import mongomock
+        from mongomock.gridfs import enable_gridfs_integration
+        enable_gridfs_integration()
+        return mongomock.MongoClient()
+    return MongoClient(
+        mongo_uri,
+        maxPoolSize=int(st.secrets.get("MONGO_MAX_POOL_SIZE", 50)),
+        minPoolSize=int(st.secrets.get("MONGO_MIN_POOL_SIZE", 0)),
+        maxIdleTimeMS=int(st.secrets.get("MONGO_MAX_IDLE_MS", 5 * 60 * 1000)),
+        serverSelectionTimeoutMS=int(st.secrets.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000)),
+        retryWrites=True,
+    )
+
+def ensure_indexes(database):
+    """Create the indexes the lookups below rely on"""
+    try:
+        database["users"].create_index([("username", ASCENDING)], unique=True)
+    except OperationFailure as e:
+        # Existing duplicate usernames must be cleaned up before the index can be built
+        print(f"Could not create unique username index: {e}")
+    database["file_sessions"].create_index([("username", ASCENDING), ("file_id", ASCENDING)], unique=True)
+    # Expired login sessions are removed by MongoDB's TTL monitor
+    database["login_sessions"].create_index("expires_at", expireAfterSeconds=0)
+
+def _migrate_dataset_holders(database):
+    """Datasets stored before references were tracked per file session only had a count"""
+    for doc in database["datasets"].find({"holders": {"$exists": False}}, projection={"_id": 1}):
+        sessions = database["file_sessions"].find({"dataset_ref.key": doc["_id"]}, projection={"username": 1, "file_id": 1})
+        database["datasets"].update_one(
+            {"_id": doc["_id"], "holders": {"$exists": False}},
+            {"$set": {"holders": [dataset_holder(s["username"], s["file_id"]) for s in sessions]},
+             "$unset": {"refcount": ""}}
+        )
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    database = get_client()["allytics"]
+    ensure_indexes(database)
+    _migrate_dataset_holders(database)
+    return database
+
+def users_collection():
+    return get_db()["users"]
+
+def file_sessions_collection():
+    # One document per (username, file_id); older users embed them in their user document
+    return get_db()["file_sessions"]
+
+def datasets_collection():
+    # One document per stored blob; holders lists the file sessions that reference it
+    return get_db()["datasets"]
+
+def login_sessions_collection():
+    # One document per logged-in browser session; session tokens carry its _id
+    return get_db()["login_sessions"]
+
+# A dataset document is being written or deleted while it has a state; it has none once ready
+DATASET_STORING = "storing"
+DATASET_RELEASING = "releasing"
+DATASET_STATE_TIMEOUT_SECONDS = 300
+DATASET_STATE_POLL_SECONDS = 0.2
+
+# Column profiles read from the datasets collection, least recently used evicted first
+PROFILE_CACHE_ENTRIES = int(st.secrets.get("PROFILE_CACHE_ENTRIES", 256))
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+def _cached_profile(key):
+    with _profiles_lock:
+        profile = _profiles.get(key)
+        if profile is not None:
+            _profiles.move_to_end(key)
+        return profile
+
+def _cache_profile(key, profile):
+    with _profiles_lock:
+        _profiles[key] = profile
+        _profiles.move_to_end(key)
+        while len(_profiles) > PROFILE_CACHE_ENTRIES:
+            _profiles.popitem(last=False)
+
+@st.cache_resource
+def get_dataset_store():
+    from utils.dataset_store import make_dataset_store
+    return make_dataset_store(
+        get_db(),
+        kind=st.secrets.get("DATASET_STORE", "gridfs"),
+        root=st.secrets.get("DATASET_DIR"),
+        cache_bytes=int(st.secrets.get("DATAFRAME_CACHE_MB", 512)) * 1024 * 1024,
+    )
+
+@st.cache_resource
+def get_sql_engine():
+    """The DuckDB engine when ANALYTICS_ENGINE=duckdb, otherwise None"""
+    from utils.sql_engine import make_sql_engine
+    return make_sql_engine(
+        get_dataset_store().backend,
+        kind=st.secrets.get("ANALYTICS_ENGINE", "pandas"),
+        spill_dir=st.secrets.get("DUCKDB_DIR"),
+        threads=st.secrets.get("DUCKDB_THREADS"),
+        memory_limit=st.secrets.get("DUCKDB_MEMORY_LIMIT"),
+    )
+
+def _artifact_dir():
+    # Next to the datasets, which sit directly in DATASET_DIR
+    root = st.secrets.get("DATASET_DIR")
+    return os.path.join(root, "artifacts") if root else None
+
+@st.cache_resource
+def get_artifact_store():
+    from utils.dataset_store import make_blob_backend
+    return ArtifactStore(
+        make_blob_backend(
+            get_db(),
+            kind=st.secrets.get("DATASET_STORE", "gridfs"),
+            root=_artifact_dir(),
+            bucket="artifacts",
+        ),
+        max_bytes=int(st.secrets.get("ARTIFACT_MAX_MB", 1024)) * 1024 * 1024,
+        max_age_seconds=int(st.secrets.get("ARTIFACT_MAX_AGE_DAYS", 90)) * 24 * 3600,
+    )
+
+@st.cache_resource
+def get_answer_cache():
+    return AnswerCache(
+        get_db()["answer_cache"],
+        max_entries=int(st.secrets.get("ANSWER_CACHE_ENTRIES", 1000)),
+        ttl_seconds=int(st.secrets.get("ANSWER_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    )
+
+@traced("db.register_user")
 def register_user(username, password, name):
-    if users_collection.find_one({"username": username}):
+    # The unique index makes this atomic: two concurrent sign-ups can't both succeed
+    try:
+        users_collection().insert_one({
+            "username": username,
+            "password": hash_password(password, PASSWORD_HASH_METHOD),
+            "name": name,
+        })
+    except DuplicateKeyError:
         return False
-    users_collection.insert_one({
-        "username": username,
-        "password": password,
-        "name": name,
-        "file_sessions": {}
-    })
     return True
 
+@traced("db.authenticate_user")
 def authenticate_user(username, password):
-    return users_collection.find_one({"username": username, "password": password})
+    # Credentials only; file sessions live in their own collection
+    user = users_collection().find_one({"username": username}, projection={"_id": 0, "name": 1, "password": 1})
+    if user is None:
+        return None
+    stored = user["password"]
+    if is_password_hash(stored):
+        if not verify_password(password, stored):
+            return None
+        upgrade = needs_rehash(stored, PASSWORD_HASH_METHOD)
+    else:
+        # Account created before passwords were hashed
+        if not hmac.compare_digest(stored.encode(), password.encode()):
+            return None
+        upgrade = True
+    if upgrade:
+        # Conditional on the old value so a concurrent password change is not overwritten
+        users_collection().update_one(
+            {"username": username, "password": stored},
+            {"$set": {"password": hash_password(password, PASSWORD_HASH_METHOD)}}
+        )
+    return {"username": username, "name": user["name"]}
+
+def _expires_at(ttl_seconds):
+    return datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+
+def create_login_session(username, ttl_seconds):
+    """Start a server-side login session and return its id"""
+    session_id = new_session_id()
+    login_sessions_collection().insert_one(
+        {"_id": session_id, "username": username, "expires_at": _expires_at(ttl_seconds)}
+    )
+    return session_id
+
+def extend_login_session(session_id, ttl_seconds):
+    """Push back a live session's expiry; False if it was revoked or has expired"""
+    result = login_sessions_collection().update_one(
+        {"_id": session_id, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"$set": {"expires_at": _expires_at(ttl_seconds)}}
+    )
+    return result.matched_count == 1
+
+def end_login_session(session_id):
+    """Revoke a login session; tokens carrying its id can no longer be refreshed"""
+    login_sessions_collection().delete_one({"_id": session_id})
 
 def convert_numpy_types(obj):
     """Convert NumPy types to native Python types for BSON compatibility"""
+    import numpy as np
     if isinstance(obj, np.integer):
         return int(obj)
     elif isinstance(obj, np.floating):
@@ -43,39 +236,260 @@ def convert_numpy_types(obj):
     else:
         return obj
 
+def clean_chat_entry(question, answer):
+    return (question, convert_numpy_types(answer))
+
+def file_session_document(session):
+    """The persisted form of a file session (references and chat history only)"""
+    return {
+        "name": session["name"],
+        "dataset_ref": session["dataset_ref"],
+        "meta": session["meta"],
+        "chat_history": [clean_chat_entry(q, a) for q, a in session["chat_history"]],
+        # Kept alongside the history so logging in can list files without fetching it
+        "chat_count": len(session["chat_history"])
+    }
+
+# Per-file updates are (file_id, update document, extra filter, upsert) tuples; None as the
+# update deletes the file session. Each one can be applied twice without changing the result,
+# since a batch that fails part way is written again.
+def file_session_update(fid, session):
+    # Drops the inline CSV of a migrated legacy session
+    return fid, {"$set": file_session_document(session), "$unset": {"data_csv": ""}}, None, True
+
+def chat_entry_update(fid, question, answer):
+    # chat_ids records which entries were already pushed, so a replay doesn't add one twice
+    entry_id = uuid.uuid4().hex
+    return fid, {
+        "$push": {"chat_history": clean_chat_entry(question, answer), "chat_ids": entry_id},
+        "$inc": {"chat_count": 1}
+    }, {"chat_ids": {"$ne": entry_id}}, False
+
+def clear_chat_update(fid):
+    return fid, {"$set": {"chat_history": [], "chat_ids": [], "chat_count": 0}}, None, False
+
+def delete_file_update(fid):
+    return fid, None, None, False
+
+def _session_operation(username, fid, update, condition, upsert):
+    selector = {"username": username, "file_id": fid}
+    if update is None:
+        return DeleteOne(selector)
+    # Only full documents upsert; a chat update for a deleted file session is dropped
+    return UpdateOne(dict(selector, **(condition or {})), update, upsert=upsert)
+
+@traced("db.write_sessions")
+def write_session_updates(username, updates):
+    """Apply a batch of per-file updates to the user's file session documents in one round trip"""
+    if not updates:
+        return
+    file_sessions_collection().bulk_write(
+        [_session_operation(username, *update) for update in updates],
+        ordered=True
+    )
+
+@traced("db.save_sessions")
 def save_user_session(username, file_sessions):
-    # Serialize DataFrames and remove non-serializable objects like agents
-    session_data = {}
+    """Full snapshot of every file session; day-to-day saves go through write_session_updates"""
+    updates = []
     for fid, session in file_sessions.items():
-        # Clean chat history to remove NumPy types
-        clean_chat_history = []
-        for question, answer in session["chat_history"]:
-            # Convert NumPy types to native Python types
-            clean_answer = convert_numpy_types(answer)
-            clean_chat_history.append((question, clean_answer))
-        
-        session_data[fid] = {
-            "name": session["name"],
-            "data_csv": session["df"].to_csv(index=False),
-            "chat_history": clean_chat_history
-        }
- 
-    users_collection.update_one(
-        {"username": username},
-        {"$set": {"file_sessions": session_data}},
-        upsert=True
+        # Also migrates a legacy session that was never opened after login
+        open_file_session(username, fid, session)
+        updates.append(file_session_update(fid, session))
+    write_session_updates(username, updates)
+    file_sessions_collection().delete_many({"username": username, "file_id": {"$nin": list(file_sessions)}})
+
+def dataset_holder(username, fid):
+    """A dataset is referenced once per file session, however many tabs have it open"""
+    return f"{username}:{fid}"
+
+@traced("db.acquire_dataset")
+def acquire_dataset(content_hash, parse, holder):
+    """
+    Add holder's reference to the shared dataset for this content hash (a no-op if it
+    already has one). The file is only parsed and stored if no user has uploaded the same
+    content before.
+    """
+    datasets = datasets_collection()
+    while True:
+        existing = datasets.find_one_and_update(
+            {"_id": content_hash, "state": {"$exists": False}},
+            {"$addToSet": {"holders": holder}},
+            projection={"ref": 1, "meta": 1}
+        )
+        if existing is not None:
+            return existing["ref"], existing["meta"]
+        try:
+            datasets.insert_one({"_id": content_hash, "state": DATASET_STORING,
+                                 "state_at": datetime.now(timezone.utc), "holders": [holder]})
+            break
+        except DuplicateKeyError:
+            pass
+        # Another upload is storing this dataset, or its last holder is deleting it. Wait for
+        # that to finish, unless it has taken so long that it must have died: then take the
+        # document over and store the blob again
+        stale = datetime.now(timezone.utc) - timedelta(seconds=DATASET_STATE_TIMEOUT_SECONDS)
+        if datasets.update_one(
+            {"_id": content_hash, "state": {"$exists": True}, "state_at": {"$lt": stale}},
+            {"$set": {"state": DATASET_STORING, "state_at": datetime.now(timezone.utc)},
+             "$addToSet": {"holders": holder}}
+        ).modified_count:
+            break
+        time.sleep(DATASET_STATE_POLL_SECONDS)
+
+    from utils.dataset_store import describe_frame
+    from utils.profile import build_profile
+    try:
+        df = parse()
+        ref = get_dataset_store().save(df, key=content_hash)
+        meta = describe_frame(df)
+        # Profile once at upload; every later reader shares this stats index
+        profile = convert_numpy_types(build_profile(df))
+    except Exception:
+        datasets.delete_one({"_id": content_hash, "state": DATASET_STORING})
+        raise
+    _cache_profile(content_hash, profile)
+    datasets.update_one(
+        {"_id": content_hash, "state": DATASET_STORING},
+        {"$set": {"ref": ref, "meta": meta, "profile": profile}, "$unset": {"state": "", "state_at": ""}}
+    )
+    return ref, meta
+
+@traced("db.get_profile")
+def get_dataset_profile(ref, load_df):
+    """Column statistics index for a dataset, built from the DataFrame only if none is stored yet"""
+    key = ref["key"]
+    profile = _cached_profile(key)
+    if profile is None:
+        doc = datasets_collection().find_one({"_id": key}, projection={"profile": 1})
+        profile = doc.get("profile") if doc else None
+        if profile is None:
+            # Datasets stored before profiling existed
+            from utils.profile import build_profile
+            profile = convert_numpy_types(build_profile(load_df()))
+            datasets_collection().update_one({"_id": key}, {"$set": {"profile": profile}})
+        _cache_profile(key, profile)
+    return profile
+
+@traced("db.release_dataset")
+def release_dataset(ref, holder):
+    """Drop holder's reference; the stored blob is deleted once nobody uses it"""
+    if ref is None:
+        return
+    datasets = datasets_collection()
+    doc = datasets.find_one_and_update(
+        {"_id": ref["key"], "holders": holder},
+        {"$pull": {"holders": holder}},
+        projection={"holders": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    # None when another tab already released this file session's reference
+    if doc is None or doc["holders"]:
+        return
+    # Mark the dataset so uploads wait instead of joining it while the blob is deleted; an
+    # upload that took a reference since the one above keeps it
+    if not datasets.update_one(
+        {"_id": ref["key"], "holders": {"$size": 0}, "state": {"$exists": False}},
+        {"$set": {"state": DATASET_RELEASING, "state_at": datetime.now(timezone.utc)}}
+    ).modified_count:
+        return
+    get_dataset_store().delete(ref)
+    with _profiles_lock:
+        _profiles.pop(ref["key"], None)
+    sql_engine = get_sql_engine()
+    if sql_engine is not None:
+        sql_engine.discard(ref["key"])
+    datasets.delete_one({"_id": ref["key"], "state": DATASET_RELEASING})
+
+def new_file_session(username, name, file_id, parse):
+    """Return the file session handle for an upload identified by its content hash"""
+    dataset_ref, meta = acquire_dataset(file_id, parse, dataset_holder(username, file_id))
+    return {
+        "name": name,
+        "dataset_ref": dataset_ref,
+        "meta": meta,
+        "memory": None,
+        "chat_history": []
+    }
+
+def get_session_df(session):
+    """Load a file session's DataFrame on first access (served from the LRU cache afterwards)"""
+    return get_dataset_store().load(session["dataset_ref"])
+
+def _migrate_embedded_sessions(username):
+    """Move file sessions still embedded in an older user document into their own collection"""
+    user = users_collection().find_one(
+        {"username": username, "file_sessions": {"$exists": True}},
+        projection={"file_sessions": 1}
     )
+    if user is None:
+        return
+    operations = [
+        UpdateOne(
+            {"username": username, "file_id": fid},
+            # Never overwrite a session that was already written to the new collection
+            {"$setOnInsert": dict(session, username=username, file_id=fid)},
+            upsert=True
+        )
+        for fid, session in user["file_sessions"].items()
+    ]
+    if operations:
+        file_sessions_collection().bulk_write(operations, ordered=False)
+    users_collection().update_one({"_id": user["_id"]}, {"$unset": {"file_sessions": ""}})
 
+@traced("db.load_sessions")
 def load_user_session(username):
-    user = users_collection.find_one({"username": username})
+    # Restore lightweight handles only: chat histories, legacy inline CSVs and DataFrames
+    # are loaded when a file is opened
+    _migrate_embedded_sessions(username)
     file_sessions = {}
-    if user and "file_sessions" in user:
-        for fid, session in user["file_sessions"].items():
-            df = pd.read_csv(StringIO(session["data_csv"]))
-            file_sessions[fid] = {
-                "name": session["name"],
-                "df": df,
-                "agent": None,
-                "chat_history": session["chat_history"]
-            }
-    return file_sessions
\ No newline at end of file
+    cursor = file_sessions_collection().find(
+        {"username": username},
+        projection={"username": 0, "chat_history": 0, "chat_ids": 0, "data_csv": 0}
+    ).sort("_id", ASCENDING)
+    for session in cursor:
+        file_sessions[session["file_id"]] = {
+            "name": session["name"],
+            "dataset_ref": session.get("dataset_ref"),
+            "meta": session.get("meta"),
+            "memory": None,
+            "chat_history": None,
+            # Missing on sessions saved before the count was stored; filled in on first open
+            "chat_count": session.get("chat_count")
+        }
+    return file_sessions
+
+@traced("db.open_session")
+def open_file_session(username, fid, session):
+    """
+    Fetch the chat history left out by load_user_session, and move a legacy session's
+    inline CSV into the dataset store
+    """
+    legacy = session.get("dataset_ref") is None
+    if session["chat_history"] is not None and not legacy:
+        return session
+    projection = {"_id": 0, "chat_history": 1}
+    if legacy:
+        projection["data_csv"] = 1
+    doc = file_sessions_collection().find_one({"username": username, "file_id": fid}, projection=projection) or {}
+    if session["chat_history"] is None:
+        session["chat_history"] = doc.get("chat_history", [])
+        if session.get("chat_count") is None:
+            file_sessions_collection().update_one(
+                {"username": username, "file_id": fid}, {"$set": {"chat_count": len(session["chat_history"])}}
+            )
+    if legacy:
+        import pandas as pd
+        from io import StringIO
+        data_csv = session.pop("data_csv", None) or doc["data_csv"]
+        content_hash = hashlib.sha256(data_csv.encode()).hexdigest()
+        session["dataset_ref"], session["meta"] = acquire_dataset(
+            content_hash, lambda: pd.read_csv(StringIO(data_csv)), dataset_holder(username, fid)
+        )
+    return session
+
+def chat_count(session):
+    """Number of chat entries, whether or not the history has been loaded yet"""
+    if session["chat_history"] is not None:
+        return len(session["chat_history"])
+    return session.get("chat_count")
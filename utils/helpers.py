@@ -1,10 +1,16 @@
 import hashlib
 
+HASH_CHUNK_SIZE = 1024 * 1024
+
 def get_file_id(uploaded_file):
+    """Content hash of an upload, read in chunks so the file is never copied whole"""
     if uploaded_file is not None:
-        file_content = uploaded_file.read()
+        digest = hashlib.sha256()
+        uploaded_file.seek(0)
+        for chunk in iter(lambda: uploaded_file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
         uploaded_file.seek(0)
-        return hashlib.md5(f"{uploaded_file.name}{len(file_content)}".encode()).hexdigest()[:8]
+        return digest.hexdigest()
     return None
 
 def clean_column_names(df):
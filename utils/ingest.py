@@ -0,0 +1,194 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_ROWS = 200_000
+CATEGORY_MAX_RATIO = 0.5     # Max unique/non-null ratio for a string column to become categorical
+DATE_SAMPLE_SIZE = 200
+DATE_MIN_MATCH = 0.9
+
+
+def _looks_like_dates(series):
+    sample = series.dropna().astype(str).head(DATE_SAMPLE_SIZE)
+    if sample.empty or not sample.str.contains(r"\d", regex=True).all():
+        return False
+    parsed = pd.to_datetime(sample, errors="coerce", format="mixed")
+    return parsed.notna().mean() >= DATE_MIN_MATCH
+
+
+def infer_schema(df):
+    """Decide which text columns become dates or categoricals, looking at every row"""
+    plan = {}
+    for col in df.select_dtypes(include=["object", "string", "category"]).columns:
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        if _looks_like_dates(values):
+            plan[col] = "datetime"
+        elif values.nunique() / len(values) <= CATEGORY_MAX_RATIO:
+            plan[col] = "category"
+    return plan
+
+
+def _downcast_float(series):
+    # Only narrow to float32 when no value changes, so aggregates stay exact
+    narrowed = series.astype(np.float32)
+    same = (narrowed.astype(np.float64) == series) | series.isna()
+    return narrowed if same.all() else series
+
+
+def shrink_frame(df, plan):
+    """Apply the schema plan and downcast numeric columns to the smallest lossless dtype"""
+    for col in df.columns:
+        kind = plan.get(col)
+        if kind == "datetime":
+            df[col] = pd.to_datetime(df[col].astype(object), errors="coerce", format="mixed")
+        elif kind == "category":
+            df[col] = df[col].astype("category")
+        elif isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Chunks are read as categoricals; mostly-unique text goes back to plain strings
+            df[col] = df[col].astype(object)
+        elif pd.api.types.is_integer_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+        elif pd.api.types.is_float_dtype(df[col]):
+            df[col] = _downcast_float(df[col])
+    return df
+
+
+def agent_frame(df):
+    """
+    Widen a stored frame for LLM-generated code: int64/float64 so arithmetic such as
+    qty * price cannot overflow a downcast int8, and plain objects instead of
+    categoricals so assigning new values or concatenating strings works. The compact
+    dtypes stay in storage and the frame cache.
+    """
+    widened = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            widened[col] = df[col].astype(object)
+        elif pd.api.types.is_bool_dtype(dtype):
+            continue
+        elif pd.api.types.is_signed_integer_dtype(dtype) and dtype != np.int64:
+            widened[col] = df[col].astype(np.int64)
+        elif pd.api.types.is_unsigned_integer_dtype(dtype) and dtype != np.uint64:
+            widened[col] = df[col].astype(np.int64)
+        elif pd.api.types.is_float_dtype(dtype) and dtype != np.float64:
+            widened[col] = df[col].astype(np.float64)
+    if not widened:
+        return df
+    # Replacing columns on a shallow copy leaves the cached frame untouched
+    out = df.copy(deep=False)
+    for col, series in widened.items():
+        out[col] = series
+    return out
+
+
+def _encode_chunk(chunk):
+    """Compact one chunk while reading: text as categoricals, numbers downcast"""
+    return shrink_frame(chunk, {col: "category" for col in chunk.select_dtypes(include=["object", "string"]).columns})
+
+
+def _column_kind(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return "text"
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    return "other"
+
+
+def _union_text(parts):
+    # All-empty chunks are read as float NaN; give them empty text categories
+    parts = [p if isinstance(p.dtype, pd.CategoricalDtype) else p.astype(object).astype("category") for p in parts]
+    return pd.Series(union_categoricals(parts, ignore_order=True, sort_categories=True))
+
+
+def _concat_chunks(chunks, read_as_text):
+    """
+    Join chunks whose dtypes were inferred one chunk at a time, typing each column the
+    way a single read_csv over the whole file would. Columns whose chunks disagree (numbers
+    in one chunk, text in another) are read again as text with read_as_text(columns).
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    columns = chunks[0].columns
+    merged, conflicts = {}, []
+    for col in columns:
+        parts = [chunk[col] for chunk in chunks]
+        # A chunk where the column is empty says nothing about its type
+        kinds = {_column_kind(part) for part in parts if part.notna().any()}
+        if kinds <= {"numeric"}:
+            # concat upcasts losslessly, e.g. int8 + int16 -> int16, int + float -> float
+            merged[col] = pd.concat(parts, ignore_index=True)
+        elif kinds == {"bool"}:
+            if any(not pd.api.types.is_bool_dtype(part) for part in parts):
+                # Missing values in a flag column: True/False/NaN objects, as read_csv gives
+                parts = [part.astype(object) for part in parts]
+            merged[col] = pd.concat(parts, ignore_index=True)
+        elif kinds == {"text"}:
+            merged[col] = _union_text(parts)
+        else:
+            conflicts.append(col)
+    if conflicts:
+        merged.update(read_as_text(conflicts))
+    return pd.DataFrame({col: merged[col] for col in columns})
+
+
+def _text_columns(file, columns, chunk_rows):
+    file.seek(0)
+    chunks = [
+        chunk.astype("category")
+        for chunk in pd.read_csv(file, usecols=columns, dtype=str, chunksize=chunk_rows)
+    ]
+    return {col: _union_text([chunk[col] for chunk in chunks]) for col in columns}
+
+
+def _file_size(file):
+    size = getattr(file, "size", None)
+    if size is None:
+        pos = file.tell()
+        size = file.seek(0, os.SEEK_END)
+        file.seek(pos)
+    return size or 1
+
+
+def read_csv_chunked(file, chunk_rows=CHUNK_ROWS, engine=None, progress=None):
+    """
+    Read a CSV into a compact DataFrame.
+    Returns the frame and a report with row count, memory before/after shrinking and load time.
+    progress, if given, is called with the fraction of the file read so far.
+    """
+    start = time.perf_counter()
+    file.seek(0)
+
+    if engine == "pyarrow":
+        # Multi-threaded Arrow parser; reads the whole file in one pass
+        df = pd.read_csv(file, engine="pyarrow")
+        raw_bytes = int(df.memory_usage(deep=True).sum())
+        if progress:
+            progress(1.0)
+    else:
+        total = _file_size(file)
+        chunks, raw_bytes = [], 0
+        for chunk in pd.read_csv(file, chunksize=chunk_rows, low_memory=False):
+            raw_bytes += int(chunk.memory_usage(deep=True).sum())
+            chunks.append(_encode_chunk(chunk))
+            if progress:
+                progress(min(file.tell() / total, 1.0))
+        df = _concat_chunks(chunks, lambda columns: _text_columns(file, columns, chunk_rows)) if chunks else pd.DataFrame()
+    # Dates and categoricals are decided on the whole column, after the chunks are joined
+    df = shrink_frame(df, infer_schema(df))
+
+    optimized_bytes = int(df.memory_usage(deep=True).sum())
+    report = {
+        "rows": int(df.shape[0]),
+        "raw_bytes": raw_bytes,
+        "optimized_bytes": optimized_bytes,
+        "saved_bytes": max(raw_bytes - optimized_bytes, 0),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return df, report
@@ -0,0 +1,144 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_USER_LIMIT = 1
+DEFAULT_TIMEOUT_SECONDS = 180
+FINISHED_JOB_TTL_SECONDS = 3600
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = "queued", "running", "done", "failed", "cancelled", "timed_out"
+FINISHED_STATES = (DONE, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobLimitError(Exception):
+    """Raised when a user already has as many jobs in flight as allowed"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled or has timed out"""
+
+
+class Job:
+    def __init__(self, user, timeout):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.timeout = timeout
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.tokens = []
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.discarded = False
+        self._cancel = threading.Event()
+
+    @property
+    def partial_output(self):
+        return "".join(self.tokens)
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def add_token(self, token):
+        """Progress callback for streamed LLM output; also where cancellation takes effect"""
+        self.check_cancelled()
+        self.tokens.append(token)
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def _finish(self, status, result=None, error=None):
+        if self.finished:
+            return
+        self.status, self.result, self.error = status, result, error
+        self.finished_at = time.time()
+
+
+class JobRunner:
+    """
+    Runs agent questions on a bounded thread pool so the Streamlit script thread
+    only submits and polls. Each user may have a limited number of jobs in flight;
+    jobs can be cancelled and time out, after which their result is discarded.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, per_user_limit=DEFAULT_PER_USER_LIMIT,
+                 timeout_seconds=DEFAULT_TIMEOUT_SECONDS):
+        self.per_user_limit = per_user_limit
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="allytics-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _holds_worker(job):
+        # A timed-out or cancelled job keeps its thread (and any agent it leased) until fn returns
+        return job.future is None or not job.future.done()
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if self._holds_worker(job):
+                continue
+            if job.discarded or (job.finished and job.finished_at < cutoff):
+                del self._jobs[job_id]
+
+    def submit(self, user, fn, *args):
+        """Queue fn(job, *args); its return value becomes job.result"""
+        with self._lock:
+            self._prune()
+            # Counted until the worker thread is free again, not just until the job is marked finished
+            active = sum(1 for job in self._jobs.values() if job.user == user and self._holds_worker(job))
+            if active >= self.per_user_limit:
+                raise JobLimitError("Please wait for your current question to finish.")
+            job = Job(user, self.timeout_seconds)
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job, fn, args):
+        if job._cancel.is_set() or job.status != QUEUED:
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            result = fn(job, *args)
+            job._finish(DONE, result=result)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            job._finish(FAILED, error=str(e))
+
+    def get(self, job_id):
+        """Look up a job, marking it timed out if it has run too long"""
+        job = self._jobs.get(job_id)
+        if job is not None and job.status == RUNNING and time.time() - job.started_at > job.timeout:
+            # Threads can't be killed: stop it at its next checkpoint and drop the result
+            job._cancel.set()
+            job._finish(TIMED_OUT, error=f"Timed out after {job.timeout}s")
+        return job
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return
+        job._cancel.set()
+        # Queued jobs never start; running ones stop at their next checkpoint (e.g. the next streamed token)
+        if job.future is not None:
+            job.future.cancel()
+        job._finish(CANCELLED)
+
+    def discard(self, job_id):
+        """Forget a finished job; one whose thread is still winding down is dropped once it exits"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.discarded = True
+            if not self._holds_worker(job):
+                del self._jobs[job_id]
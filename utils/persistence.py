@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from pymongo.errors import BulkWriteError
+from utils.db import write_session_updates
+
+# A single writer thread applies batches in the order they were submitted
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="allytics-persist")
+
+
+class SessionWriter:
+    """
+    Collects dirty file-session updates and writes them to MongoDB in the background.
+    Updates are written strictly in the order they were queued: a batch that fails goes
+    back to the front of the queue, and nothing queued after it is written before it.
+    """
+
+    def __init__(self, username):
+        self.username = username
+        self.failed = []          # Updates MongoDB rejected outright; never retried
+        self._queue = []
+        self._writing = []        # The batch on the writer thread right now
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def queue(self, update):
+        with self._lock:
+            self._queue.append(update)
+
+    @property
+    def unsaved(self):
+        """Updates not stored yet: still queued, waiting for a retry, or rejected"""
+        with self._lock:
+            return self.failed + self._writing + self._queue
+
+    def _drain(self):
+        # Runs on the writer thread; takes everything queued so far as one batch
+        with self._lock:
+            batch, self._queue = self._queue, []
+            self._writing = batch
+        if not batch:
+            return
+        try:
+            write_session_updates(self.username, batch)
+        except BulkWriteError as e:
+            # An ordered bulk write stops at the first rejected update: the ones before it
+            # are stored, the rejected one would fail again, and the rest are retried
+            index = e.details["writeErrors"][0]["index"]
+            print(f"Session update rejected, dropping it: {e.details['writeErrors'][0].get('errmsg')}")
+            with self._lock:
+                self.failed.append(batch[index])
+                self._queue = batch[index + 1:] + self._queue
+                self._writing = []
+        except Exception as e:
+            # e.g. a lost connection; every update can be applied twice, so replay the batch
+            print(f"Session save failed, will retry: {e}")
+            with self._lock:
+                self._queue = batch + self._queue
+                self._writing = []
+        else:
+            with self._lock:
+                self._writing = []
+
+    def flush(self):
+        """Submit pending updates without blocking the script thread"""
+        self._futures = [future for future in self._futures if not future.done()]
+        with self._lock:
+            if not self._queue:
+                return
+        self._futures.append(_executor.submit(self._drain))
+
+    def wait(self, timeout=30):
+        """
+        Write everything queued so far and block until it is stored, retrying a failed
+        batch once. Returns the updates that could not be saved instead of raising.
+        """
+        for _ in range(2):
+            self.flush()
+            _, running = wait_futures(self._futures, timeout=timeout)
+            if running:
+                print(f"Session save still running after {timeout}s")
+                break
+            with self._lock:
+                if not self._queue:
+                    break
+        unsaved = self.unsaved
+        if unsaved:
+            print(f"{len(unsaved)} session update(s) for {self.username} were not saved")
+        return unsaved
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+from utils.sql_engine import quote_identifier
+
+PAGE_SIZES = [25, 50, 100, 250]
+FILTER_OPS = ["contains", "=", "!=", ">", ">=", "<", "<="]
+
+
+def _coerce(series, value):
+    """Interpret the filter text in the column's own type"""
+    if pd.api.types.is_bool_dtype(series):
+        return value.strip().lower() in ("true", "1", "yes")
+    if pd.api.types.is_numeric_dtype(series):
+        return float(value)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.Timestamp(value)
+    return value
+
+
+def filter_mask(df, column, op, value):
+    series = df[column]
+    if op == "contains":
+        return series.astype(str).str.contains(value, case=False, regex=False, na=False).to_numpy()
+    target = _coerce(series, value)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Ordered comparisons aren't defined on unordered categoricals
+        series = series.astype(object)
+    compare = {"=": series.eq, "!=": series.ne, ">": series.gt, ">=": series.ge, "<": series.lt, "<=": series.le}
+    return compare[op](target).fillna(op == "!=").to_numpy(dtype=bool)
+
+
+def row_order(df, sort_by=None, ascending=True, filter_column=None, filter_op=None, filter_value=None):
+    """
+    Positions of the rows to show, in display order, after filtering and sorting.
+    None means all rows in their original order (nothing to compute).
+    """
+    positions = None
+    if filter_column and filter_value not in (None, ""):
+        positions = np.flatnonzero(filter_mask(df, filter_column, filter_op, filter_value))
+    if sort_by:
+        column = df[sort_by] if positions is None else df[sort_by].iloc[positions]
+        order = column.reset_index(drop=True) \
+            .sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        positions = order if positions is None else positions[order]
+    return positions
+
+
+def page_slice(df, positions, page, page_size, columns=None):
+    """One page of the (filtered, sorted) frame, projected to the chosen columns"""
+    start = (page - 1) * page_size
+    if positions is None:
+        rows = df.iloc[start:start + page_size]
+    else:
+        rows = df.iloc[positions[start:start + page_size]]
+    return rows[columns] if columns else rows
+
+
+def row_count(df, positions):
+    return len(df) if positions is None else len(positions)
+
+
+def _sql_filter(engine, source, filter_column, filter_op, filter_value):
+    """WHERE clause and parameters equivalent to filter_mask"""
+    if not filter_column or filter_value in (None, ""):
+        return "TRUE", []
+    column = quote_identifier(filter_column)
+    if filter_op == "contains":
+        return f"contains(lower(CAST({column} AS VARCHAR)), lower(?))", [filter_value]
+    # Coerce the text the same way as the pandas path, from the column's stored type
+    empty = engine.query(f"SELECT {column} FROM {source} LIMIT 0")
+    target = _coerce(empty[filter_column], filter_value)
+    if filter_op == "!=":
+        # Missing values count as "not equal", like in pandas
+        return f"{column} IS DISTINCT FROM ?", [target]
+    return f"{column} {filter_op} ?", [target]
+
+
+def sql_row_count(engine, key, filter_column=None, filter_op=None, filter_value=None):
+    source = engine.table(key)
+    where, params = _sql_filter(engine, source, filter_column, filter_op, filter_value)
+    return engine.scalar(f"SELECT count(*) FROM {source} WHERE {where}", params)
+
+
+def sql_page(engine, key, columns, sort_by=None, ascending=True, filter_column=None, filter_op=None,
+             filter_value=None, page=1, page_size=PAGE_SIZES[1]):
+    """page_slice computed by the SQL engine: only the requested rows and columns are read"""
+    source = engine.table(key, row_numbers=True)
+    where, params = _sql_filter(engine, source, filter_column, filter_op, filter_value)
+    order = "file_row_number"
+    if sort_by:
+        # Row number as tie-breaker keeps equal values in file order, like a stable sort
+        order = f"{quote_identifier(sort_by)} {'ASC' if ascending else 'DESC'} NULLS LAST, file_row_number"
+    select = ", ".join(quote_identifier(col) for col in columns)
+    return engine.query(
+        f"SELECT {select} FROM {source} WHERE {where} ORDER BY {order} LIMIT {int(page_size)} OFFSET {int((page - 1) * page_size)}",
+        params,
+    )
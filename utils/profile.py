@@ -0,0 +1,154 @@
+import re
+import numpy as np
+import pandas as pd
+
+TOP_VALUES = 5
+PROFILE_VERSION = 1
+
+
+def _scalar(value):
+    """Plain Python value for BSON/JSON (NumPy scalars, timestamps, categories)"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, bool, str)):
+        return value
+    return str(value)
+
+
+def _numeric_stats(values):
+    # Vectorized over the raw array; NaN-aware reductions skip missing values
+    finite = values[~np.isnan(values)]
+    if finite.size == 0:
+        return {}
+    q25, q50, q75 = np.percentile(finite, [25, 50, 75])
+    return {
+        "min": float(finite.min()),
+        "max": float(finite.max()),
+        "mean": float(finite.mean()),
+        "std": float(finite.std(ddof=1)) if finite.size > 1 else 0.0,
+        "sum": float(finite.sum()),
+        "quantiles": {"25": float(q25), "50": float(q50), "75": float(q75)},
+    }
+
+
+def _column_kind(series):
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric"
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return "categorical"
+    return "text"
+
+
+def profile_column(series):
+    kind = _column_kind(series)
+    nulls = int(series.isna().sum())
+    stats = {
+        "dtype": str(series.dtype),
+        "kind": kind,
+        "nulls": nulls,
+        "unique": int(series.nunique(dropna=True)),
+    }
+    if kind == "numeric":
+        stats.update(_numeric_stats(series.to_numpy(dtype=np.float64, na_value=np.nan)))
+    elif kind == "datetime" and nulls < len(series):
+        stats["min"] = _scalar(series.min())
+        stats["max"] = _scalar(series.max())
+    if kind in ("categorical", "text", "bool"):
+        top = series.value_counts(dropna=True).head(TOP_VALUES)
+        stats["top"] = [[_scalar(value), int(count)] for value, count in top.items()]
+    return stats
+
+
+def build_profile(df):
+    """Per-column statistics index for a dataset, computed once at upload"""
+    return {
+        "version": PROFILE_VERSION,
+        "rows": int(df.shape[0]),
+        "columns": {str(col): profile_column(df[col]) for col in df.columns},
+    }
+
+
+def columns_of_kind(profile, *kinds):
+    return [col for col, stats in profile["columns"].items() if stats["kind"] in kinds]
+
+
+_STAT_WORDS = {
+    "max": "max", "maximum": "max", "highest": "max", "largest": "max",
+    "min": "min", "minimum": "min", "lowest": "min", "smallest": "min",
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "median": "median", "sum": "sum", "total": "sum",
+    "standard deviation": "std", "std": "std",
+}
+_STAT_LABELS = {"max": "maximum", "min": "minimum", "mean": "average", "median": "median",
+                "sum": "total", "std": "standard deviation"}
+_PREFIX = r"^(?:what(?:'s| is| are)?|show(?: me)?|give(?: me)?|tell me|find)?\s*(?:the\s+)?"
+_STAT_QUESTION = re.compile(
+    _PREFIX + r"(?P<stat>" + "|".join(sorted(_STAT_WORDS, key=len, reverse=True)) + r")"
+    r"\s+(?:value\s+)?(?:of|for|in)?\s*(?:the\s+)?(?P<col>.+?)(?:\s+column)?$"
+)
+_ROWS_QUESTION = re.compile(r"^how many (?:rows|records|entries)(?: are there)?(?: in (?:the|this) (?:data(?:set)?|file|table))?$")
+_UNIQUE_QUESTION = re.compile(r"^how many (?:unique|distinct) (?:values (?:in|of|for) )?(?:the\s+)?(?P<col>.+?)(?:\s+column)?(?: are there)?$")
+_NULLS_QUESTION = re.compile(r"^how many (?:missing|null|empty) values (?:are there )?(?:in|of|for) (?:the\s+)?(?P<col>.+?)(?:\s+column)?$")
+
+
+def _find_column(profile, name):
+    wanted = re.sub(r"\s+", "_", name.strip().lower())
+    for col in profile["columns"]:
+        if col.lower() == wanted:
+            return col
+    return None
+
+
+def _format_number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}"
+    if isinstance(value, float):
+        return f"{value:,.4g}" if abs(value) >= 1e6 or abs(value) < 1e-3 else f"{value:,.2f}"
+    return str(value)
+
+
+def answer_from_profile(question, profile):
+    """
+    Answer simple aggregate questions (max/min/average/sum/median of a column, row,
+    distinct and missing counts) straight from the profile. Returns None otherwise.
+    """
+    q = re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+
+    if _ROWS_QUESTION.match(q):
+        return f"The dataset has **{profile['rows']:,}** rows."
+
+    match = _UNIQUE_QUESTION.match(q)
+    if match:
+        col = _find_column(profile, match.group("col"))
+        if col:
+            return f"**{col}** has **{profile['columns'][col]['unique']:,}** distinct values."
+
+    match = _NULLS_QUESTION.match(q)
+    if match:
+        col = _find_column(profile, match.group("col"))
+        if col:
+            return f"**{col}** has **{profile['columns'][col]['nulls']:,}** missing values."
+
+    match = _STAT_QUESTION.match(q)
+    if match:
+        col = _find_column(profile, match.group("col"))
+        stat = _STAT_WORDS[match.group("stat")]
+        if col is None:
+            return None
+        stats = profile["columns"][col]
+        if stat == "median":
+            value = stats.get("quantiles", {}).get("50")
+        else:
+            value = stats.get(stat)
+        if value is None or (stats["kind"] != "numeric" and stat not in ("min", "max")):
+            return None
+        return f"The {_STAT_LABELS[stat]} of **{col}** is **{_format_number(value)}**."
+    return None
@@ -0,0 +1,108 @@
+import re
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+MIN_VALUE_OVERLAP = 0.5       # Share of the smaller column's distinct values found in the other
+MIN_NAMED_OVERLAP = 0.1       # Lower bar when the column names already match
+KEY_UNIQUE_RATIO = 0.9        # Distinct/rows above which a column looks like a key
+MAX_DISTINCT_VALUES = 100_000
+MAX_PAIRS = 50
+MAX_CACHED_RESULTS = 64
+
+_KEY_NAME = re.compile(r"(?:^|_)(?:id|key|code|no|number)$")
+
+_results = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def _normalize(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def _family(stats):
+    """Columns can only join with columns of the same family"""
+    if stats["kind"] == "numeric" and stats["dtype"].startswith(("int", "uint", "Int", "UInt")):
+        return "integer"
+    if stats["kind"] in ("text", "categorical"):
+        return "text"
+    return None
+
+
+def _looks_like_key(col, stats, rows):
+    return bool(_KEY_NAME.search(str(col).lower())) or (rows and stats["unique"] / rows >= KEY_UNIQUE_RATIO)
+
+
+def _distinct(df, col, family):
+    values = df[col].dropna().unique()
+    values = values[:MAX_DISTINCT_VALUES]
+    return set(pd.Series(values).astype("int64" if family == "integer" else str).tolist())
+
+
+def _candidate_pairs(profiles):
+    """
+    Column pairs across frames worth checking: same family, and either matching names
+    with a key-like column on one side, or key-like columns on both sides.
+    """
+    pairs = []
+    for i, left in enumerate(profiles):
+        for j in range(i + 1, len(profiles)):
+            right = profiles[j]
+            for lcol, lstats in left["columns"].items():
+                family = _family(lstats)
+                if family is None or lstats["unique"] == 0:
+                    continue
+                for rcol, rstats in right["columns"].items():
+                    if _family(rstats) != family or rstats["unique"] == 0:
+                        continue
+                    named = _normalize(lcol) == _normalize(rcol)
+                    left_key = _looks_like_key(lcol, lstats, left["rows"])
+                    right_key = _looks_like_key(rcol, rstats, right["rows"])
+                    if (named and (left_key or right_key)) or (left_key and right_key):
+                        pairs.append((not named, i, lcol, j, rcol, family))
+    # Name matches first, so they are never cut by the pair limit
+    return [pair[1:] for pair in sorted(pairs, key=lambda pair: pair[0])[:MAX_PAIRS]]
+
+
+def find_relationships(frames, profiles):
+    """
+    Likely join keys between the frames of a workspace, from matching column names and
+    overlapping distinct values. frames are (dataset_key, df) pairs and profiles their
+    column profiles in the same order. Cached per set of datasets.
+    """
+    cache_key = tuple(key for key, _ in frames)
+    with _results_lock:
+        if cache_key in _results:
+            _results.move_to_end(cache_key)
+            return _results[cache_key]
+
+    distinct = {}
+    relationships = []
+    for i, lcol, j, rcol, family in _candidate_pairs(profiles):
+        for side, col in ((i, lcol), (j, rcol)):
+            if (side, col) not in distinct:
+                distinct[side, col] = _distinct(frames[side][1], col, family)
+        left, right = distinct[i, lcol], distinct[j, rcol]
+        overlap = len(left & right) / min(len(left), len(right))
+        named = _normalize(lcol) == _normalize(rcol)
+        if overlap >= (MIN_NAMED_OVERLAP if named else MIN_VALUE_OVERLAP):
+            relationships.append({
+                "left": i, "left_column": lcol, "right": j, "right_column": rcol,
+                "overlap": round(overlap, 3), "matched_by": "name" if named else "values",
+            })
+    relationships.sort(key=lambda rel: rel["overlap"], reverse=True)
+
+    with _results_lock:
+        _results[cache_key] = relationships
+        while len(_results) > MAX_CACHED_RESULTS:
+            _results.popitem(last=False)
+    return relationships
+
+
+def describe_relationships(relationships):
+    """Join hints for the LLM, one per line"""
+    return "\n".join(
+        f"- dfs[{rel['left']}]['{rel['left_column']}'] joins dfs[{rel['right']}]['{rel['right_column']}'] "
+        f"({rel['overlap']:.0%} of values match)"
+        for rel in relationships
+    )
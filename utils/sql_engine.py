@@ -0,0 +1,78 @@
+import os
+import threading
+from utils.dataset_store import LocalBlobBackend
+
+try:
+    import duckdb
+except ImportError:  # Optional: only needed with ANALYTICS_ENGINE=duckdb
+    duckdb = None
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _quote_literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+class DuckDBEngine:
+    """
+    Runs previews and chart aggregations as DuckDB queries directly over the stored
+    Parquet files, out of core and multi-threaded, so the DataFrame never has to be
+    loaded for them. Datasets kept in GridFS are spilled to a local cache directory first.
+    """
+
+    def __init__(self, backend, spill_dir, threads=None, memory_limit=None):
+        if duckdb is None:
+            raise RuntimeError("ANALYTICS_ENGINE=duckdb requires the duckdb package (pip install duckdb)")
+        self.backend = backend
+        self.spill = None if isinstance(backend, LocalBlobBackend) else LocalBlobBackend(spill_dir)
+        config = {"temp_directory": os.path.join(spill_dir, "tmp")}
+        if threads:
+            config["threads"] = int(threads)
+        if memory_limit:
+            config["memory_limit"] = memory_limit
+        self._db = duckdb.connect(":memory:", config=config)
+        self._local = threading.local()
+
+    def _cursor(self):
+        # A DuckDB connection is not thread-safe; each thread gets its own cursor on the shared database
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._db.cursor()
+        return cursor
+
+    def parquet_path(self, key):
+        if self.spill is None:
+            return self.backend.path(key)
+        if not self.spill.exists(key):
+            self.spill.put(key, self.backend.get(key))
+        return self.spill.path(key)
+
+    def table(self, key, row_numbers=False):
+        """FROM clause reading a stored dataset"""
+        options = ", file_row_number = true" if row_numbers else ""
+        return f"read_parquet({_quote_literal(self.parquet_path(key))}{options})"
+
+    def query(self, sql, params=None):
+        """Run a query and return the (small) result as a DataFrame"""
+        return self._cursor().execute(sql, params or []).df()
+
+    def scalar(self, sql, params=None):
+        return self._cursor().execute(sql, params or []).fetchone()[0]
+
+    def discard(self, key):
+        """Forget a deleted dataset's spilled copy"""
+        if self.spill is not None:
+            self.spill.delete(key)
+
+
+def make_sql_engine(backend, kind="pandas", spill_dir=None, threads=None, memory_limit=None):
+    """Build the analytics engine configured for this deployment; None means plain pandas"""
+    if kind == "pandas":
+        return None
+    if kind == "duckdb":
+        spill_dir = spill_dir or os.path.join(os.getcwd(), ".allytics_data", "duckdb")
+        return DuckDBEngine(backend, spill_dir, threads=threads, memory_limit=memory_limit)
+    raise ValueError(f"Unknown analytics engine: {kind}")
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+from collections import deque, defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RECENT_SAMPLES = 1000     # Per stage, for percentiles
+RECENT_TRACES = 200       # Finished root spans kept for the admin panel
+DEFAULT_TRACE_MAX_BYTES = 50 * 1024 * 1024
+METRIC_PREFIX = "allytics"
+
+_current_span = contextvars.ContextVar("allytics_span", default=None)
+
+
+class Span:
+    """One timed pipeline stage; spans opened inside it (on the same thread or task) become its children"""
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.root = parent.root if parent else self
+        self.attrs = dict(attrs)
+        self.started_at = time.time()
+        self.seconds = None
+        self.error = None
+        self.child_seconds = 0.0
+        self.spans = []          # Every finished descendant, kept on the root only
+        self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def self_seconds(self):
+        """Time spent in this stage outside its child stages"""
+        return max((self.seconds or 0.0) - self.child_seconds, 0.0)
+
+    def _finish(self):
+        self.seconds = time.perf_counter() - self._start
+        if self.parent is not None:
+            self.parent.child_seconds += self.seconds
+            self.root.spans.append(self)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "id": self.id,
+            "parent": self.parent.id if self.parent else None,
+            "started_at": self.started_at,
+            "seconds": round(self.seconds, 6),
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in sorted(labels)) + "}"
+
+
+class Telemetry:
+    """
+    In-process spans and metrics: duration histograms per stage, counters, recent traces
+    for the admin panel, a JSON-lines trace log and Prometheus text exposition.
+    """
+
+    def __init__(self, trace_path=None, trace_max_bytes=DEFAULT_TRACE_MAX_BYTES):
+        self.trace_path = trace_path
+        self.trace_max_bytes = trace_max_bytes
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = defaultdict(int)
+        self._samples = defaultdict(lambda: deque(maxlen=RECENT_SAMPLES))
+        self._counters = defaultdict(float)
+        self._traces = deque(maxlen=RECENT_TRACES)
+
+    def configure(self, trace_path=None, trace_max_bytes=DEFAULT_TRACE_MAX_BYTES):
+        self.trace_path = trace_path
+        self.trace_max_bytes = trace_max_bytes
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time a stage; attributes such as token counts or payload sizes can be added with span.set()"""
+        span = Span(name, _current_span.get(), attrs)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"[:200]
+            raise
+        finally:
+            _current_span.reset(token)
+            span._finish()
+            self.observe(name, span.seconds, error=span.error is not None)
+            if span.parent is None:
+                self._finish_trace(span)
+
+    def traced(self, name):
+        """Decorator form of span()"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def current_span(self):
+        return _current_span.get()
+
+    def observe(self, name, seconds, error=False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+            index = bisect.bisect_left(BUCKETS, seconds)
+            if index < len(BUCKETS):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+            self._samples[name].append(seconds)
+            if error:
+                self._errors[name] += 1
+
+    def count(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[name, tuple(labels.items())] += value
+
+    def _finish_trace(self, root):
+        record = root.to_dict()
+        record["trace_id"] = root.id
+        record["spans"] = [span.to_dict() for span in root.spans]
+        with self._lock:
+            self._traces.append(record)
+        if self.trace_path:
+            self._write_trace(record)
+
+    def _write_trace(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.trace_path)), exist_ok=True)
+                if os.path.exists(self.trace_path) and os.path.getsize(self.trace_path) > self.trace_max_bytes:
+                    # Keep one rotated file so the log can't grow without bound
+                    os.replace(self.trace_path, self.trace_path + ".1")
+                with open(self.trace_path, "a") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"Could not write trace log: {e}")
+
+    def stage_stats(self):
+        """count, error count and p50/p95/max seconds over the recent samples of every stage"""
+        with self._lock:
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            totals = {name: histogram["count"] for name, histogram in self._histograms.items()}
+            errors = dict(self._errors)
+        return [{
+            "stage": name,
+            "count": totals[name],
+            "errors": errors.get(name, 0),
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "max": values[-1],
+        } for name, values in sorted(samples.items())]
+
+    def recent_traces(self, name=None):
+        with self._lock:
+            traces = list(self._traces)
+        return [trace for trace in traces if name is None or trace["name"] == name]
+
+    def slowest(self, name=None, limit=10):
+        return sorted(self.recent_traces(name), key=lambda trace: trace["seconds"], reverse=True)[:limit]
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            histograms = {name: dict(h, buckets=list(h["buckets"])) for name, h in self._histograms.items()}
+            errors = dict(self._errors)
+            counters = dict(self._counters)
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent per pipeline stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS, histogram["buckets"]):
+                cumulative += bucket
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_sum{{stage="{name}"}} {histogram["sum"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_count{{stage="{name}"}} {histogram["count"]}')
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+        for name, value in sorted(errors.items()):
+            lines.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{name}"}} {value}')
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}_total{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port, host="0.0.0.0"):
+        """Serve /metrics for a Prometheus scraper from a background thread"""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="allytics-metrics").start()
+        return server
+
+
+# Process-wide instance used by the instrumented modules
+telemetry = Telemetry()
+span = telemetry.span
+traced = telemetry.traced